@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import starpasta
+
+# Benchmark for the sim_run output buffer
+# Builds a track of the given number of 15-column rows the way sim_run does, once with the old per-step np.append
+# and once with DataBuffer, and reports the time and peak memory of each
+
+def fill_append(steps):
+    data = np.empty([0,15])
+    for step in range(steps):
+        data = np.append(data, [[step, 1, step*0.1, 1.0, 0.0, 0.0, 0.0, 1.0, 1.0, 0.0, 5778.0, 0.95, 0.99, 1.67, 1.77]], 0)
+    return data
+
+def fill_buffer(steps):
+    data = starpasta.DataBuffer(15)
+    for step in range(steps):
+        data.append([step, 1, step*0.1, 1.0, 0.0, 0.0, 0.0, 1.0, 1.0, 0.0, 5778.0, 0.95, 0.99, 1.67, 1.77])
+    return data.array()
+
+def measure(fill, steps):
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = fill(steps)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, data
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare np.append against DataBuffer for building sim_run output')
+    parser.add_argument('--steps', type=int, nargs='+', default=[1000, 10000, 100000], help='track lengths to build')
+    parser.add_argument('--skip-append', action='store_true', help='only time DataBuffer; np.append takes minutes at 100k steps')
+    args = parser.parse_args()
+
+    print('%8s %12s %12s %10s %14s %14s' % ('steps', 'append (s)', 'buffer (s)', 'speedup', 'append peak', 'buffer peak'))
+    for steps in args.steps:
+        tb, pb, db = measure(fill_buffer, steps)
+        if args.skip_append:
+            print('%8d %12s %12.4f %10s %14s %14.2e' % (steps, '-', tb, '-', '-', pb))
+            continue
+        ta, pa, da = measure(fill_append, steps)
+        assert np.array_equal(da, db)
+        print('%8d %12.4f %12.4f %10.1f %14.2e %14.2e' % (steps, ta, tb, ta / tb, pa, pb))
+    print('final array size for %d steps: %.2e bytes' % (args.steps[-1], db.nbytes))
+
+if __name__ == '__main__':
+    main()
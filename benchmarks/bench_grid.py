@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import starpasta
+
+# End-to-end benchmark for sim_run over a canonical set of stars
+# Times each star (the median of several runs, repeated until they add up to at least min_time), then runs it once more under
+# tracemalloc for its peak memory, and compares the results against a baseline .json saved earlier on the same machine
+#
+# The steps and stages of every star must match the baseline exactly; the speed is only judged on the total time over the whole set,
+# since a single star taking a few ms varies by more than any tolerance worth setting. Times depend on the machine, so no baseline
+# is kept in the repository: save one before making a change, and compare against it after
+#
+# The set covers the expensive paths: the TPAGB (stage 6) of low and intermediate masses, the CHeB blue loops of intermediate masses,
+# naked helium stars and pair-instability supernovae (stage 15) at high masses, and the remnant tails out to 10^8 Myr
+#
+# Example, storing a baseline before a change:
+#   python benchmarks/bench_grid.py --save
+# and checking the change against it:
+#   python benchmarks/bench_grid.py
+
+masses = [0.08, 0.5, 1, 2, 5, 8, 15, 25, 60, 150, 300]
+metallicities = [0.0001, 0.002, 0.02]
+baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_grid.json')
+
+#Runs one star, returning its time, steps, steps per second, peak memory and output size
+#The time is the median of at least repeat runs, with more for fast stars until the runs add up to min_time seconds
+def measure(model, M, repeat, min_time):
+    result = {'M': M, 'Z': model.Z}
+    try:
+        seconds = []
+        while len(seconds) < repeat or sum(seconds) < min_time:
+            start = time.perf_counter()
+            data = model.sim_run(M)
+            seconds.append(time.perf_counter() - start)
+        tracemalloc.start()
+        model.sim_run(M)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    except Exception as err:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        result['error'] = type(err).__name__ + ': ' + str(err)
+        return result
+    result['seconds'] = float(np.median(seconds))
+    result['runs'] = len(seconds)
+    result['steps'] = model.steps_accepted
+    result['rejected'] = model.steps_rejected
+    result['steps_per_second'] = model.steps_accepted / result['seconds']
+    result['peak_bytes'] = peak
+    result['rows'] = len(data)
+    result['bytes'] = data.nbytes
+    result['stages'] = '-'.join(str(int(stage)) for stage in dict.fromkeys(data[:,1]))
+    return result
+
+def run(repeat, min_time, options):
+    results = []
+    for Z in metallicities:
+        model = starpasta.StellarModel(Z, quiet=True, **options)
+        for M in masses:
+            results.append(measure(model, M, repeat, min_time))
+    return results
+
+#Lines up results with the baseline by (M, Z) and reports the change in each
+#Stars whose steps or stages have changed, or that now fail, are flagged, and so is the whole set if its total time is more than tol slower
+def compare(results, baseline, tol):
+    old = {(star['M'], star['Z']): star for star in baseline['stars']}
+    flagged = []
+    print('%7s %7s %10s %10s %8s %8s %8s %12s  %s' % ('M', 'Z', 'time (s)', 'baseline', 'ratio', 'steps', 'was', 'peak (B)', 'stages'))
+    for star in results:
+        key = (star['M'], star['Z'])
+        base = old.get(key)
+        if 'error' in star:
+            print('%7g %7g  %s' % (star['M'], star['Z'], star['error']))
+            if base is not None and 'error' not in base:
+                flagged.append((key, 'now fails'))
+            continue
+        if base is None or 'error' in base:
+            print('%7g %7g %10.4f %10s %8s %8d %8s %12d  %s' % (star['M'], star['Z'], star['seconds'], '-', '-', star['steps'], '-', star['peak_bytes'], star['stages']))
+            continue
+        ratio = star['seconds'] / base['seconds']
+        print('%7g %7g %10.4f %10.4f %8.2f %8d %8d %12d  %s' % (star['M'], star['Z'], star['seconds'], base['seconds'], ratio, star['steps'], base['steps'], star['peak_bytes'], star['stages']))
+        if star['steps'] != base['steps']:
+            flagged.append((key, 'steps %d -> %d' % (base['steps'], star['steps'])))
+        if star['stages'] != base['stages']:
+            flagged.append((key, 'stages ' + base['stages'] + ' -> ' + star['stages']))
+    timed = [star for star in results if 'seconds' in star and 'seconds' in old.get((star['M'], star['Z']), {})]     #stars timed in both
+    total = sum(star['seconds'] for star in timed)
+    base_total = sum(old[(star['M'], star['Z'])]['seconds'] for star in timed)
+    ratio = total / base_total if base_total else float('nan')
+    print('total %.4f s against %.4f s in the baseline (%.2fx)' % (total, base_total, ratio))
+    for key, note in flagged:
+        print(' M = %g, Z = %g: %s' % (key[0], key[1], note))
+    if ratio > 1 + tol:
+        flagged.append((None, 'slower by %.0f%% in total' % (100 * (ratio - 1))))
+        print(' ' + flagged[-1][1])
+    return flagged
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sim_run over a canonical set of stars and compare against a stored baseline')
+    parser.add_argument('--repeat', type=int, default=7, help='least number of runs of each star; the median is kept')
+    parser.add_argument('--min-time', type=float, default=0.2, help='keep running each star until its runs add up to this many seconds')
+    parser.add_argument('--baseline', default=baseline_file, help='baseline .json to compare against or save to')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline instead of comparing')
+    parser.add_argument('--out', default=None, help='also save the results to this .json')
+    parser.add_argument('--tol', type=float, default=0.1, help='flag the set if its total time is this much slower than the baseline (0.1 = 10%%)')
+    parser.add_argument('--full-LM', action='store_true', help='continue stars below 0.8 solar masses past the main sequence')
+    args = parser.parse_args()
+
+    options = {'stop_LM': not args.full_LM}
+    results = run(args.repeat, args.min_time, options)
+    record = {'python': sys.version.split()[0], 'numpy': np.__version__, 'options': options, 'stars': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(record, f, indent=1)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(record, f, indent=1)
+        print('Baseline saved to ' + args.baseline)
+        return
+    if not os.path.exists(args.baseline):
+        sys.exit('No baseline at ' + args.baseline + '; save one on this machine first with --save')
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('options') != options:
+        print('WARNING: baseline was run with options ' + str(baseline.get('options')))
+    flagged = compare(results, baseline, args.tol)
+    sys.exit(1 if flagged else 0)
+
+if __name__ == '__main__':
+    main()
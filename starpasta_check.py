@@ -0,0 +1,174 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import starpasta
+from starpasta_grid import grid_values
+from starpasta_query import Track
+
+# Star Pasta Equivalence Check
+# Stores reference tracks for a grid of stars, and checks that later versions of the code still reproduce them,
+# so that optimizations to evolve, timestep or the stage functions can be shown not to have changed the results
+#
+# New tracks are lined up with the references stage by stage: each reference row is compared with the new track interpolated
+# to the same age within the same stage, as track.at(ages, stage=...) does. The largest relative deviation of each column
+# is reported for every stage, along with any change in the sequence of stages or the type of remnant
+#
+# Example, before and after a change:
+#   python starpasta_check.py --save reference.npz --mass 0.5,1,2,5,8,15,25,60,150 --Z 0.0001,0.002,0.02
+#   python starpasta_check.py reference.npz --tol 1e-6 --tol-col L=1e-3
+
+check_columns = [name for name in starpasta.columns if name not in ('step', 'stage')]
+default_tol = 1e-6
+floor = 1e-30   #keeps columns that are 0 in the reference, such as Mc on the MS, from dividing by zero
+
+#Stages in the order a track passes through them
+def stage_sequence(data):
+    stages = data[:,1].astype(int)
+    return [int(stages[0])] + [int(s) for s in stages[1:][np.diff(stages) != 0]]
+
+#Compares a new track against a reference one
+#Returns the stage sequences of both, and for each stage the reference passes through, the largest relative deviation of each column
+#and the number of reference rows that fell outside the stage in the new track; the start and end ages of each stage are compared as 't'
+def compare_tracks(ref, new):
+    result = {'stages': stage_sequence(ref), 'new_stages': stage_sequence(new), 'deviation': {}, 'unmatched': {}}
+    ref_track = Track(ref)
+    new_track = Track(new)
+    for stage in ref_track.stages:
+        i0, i1 = ref_track.stages[stage]
+        span = new_track.stage_span(stage)
+        if span is None:
+            continue
+        rows = ref[i0:i1]
+        aligned = new_track.at(rows[:,2], stage=stage)
+        inside = ~np.isnan(aligned[:,2])
+        dev = {}
+        for name in check_columns:
+            col = starpasta.columns.index(name)
+            if name == 't':
+                ref_span = np.array(ref_track.stage_span(stage))
+                diff = np.abs(np.array(span) - ref_span) / np.maximum(np.abs(ref_span), floor)
+            else:
+                diff = np.abs(aligned[inside,col] - rows[inside,col]) / np.maximum(np.abs(rows[inside,col]), floor)
+            dev[name] = float(diff.max()) if len(diff) else 0.0
+        result['deviation'][stage] = dev
+        result['unmatched'][stage] = int((~inside).sum())
+    return result
+
+#Lists the ways a comparison from compare_tracks fails the tolerances
+#tol is the relative tolerance for every column, and col_tol overrides it for the named columns
+def failures(result, tol=default_tol, col_tol=None):
+    col_tol = col_tol or {}
+    found = []
+    if result['stages'] != result['new_stages']:
+        found.append('stages ' + '-'.join(map(str, result['stages'])) + ' -> ' + '-'.join(map(str, result['new_stages'])))
+        if result['stages'][-1] != result['new_stages'][-1]:
+            found.append('remnant ' + str(result['stages'][-1]) + ' -> ' + str(result['new_stages'][-1]))
+    for stage, dev in result['deviation'].items():
+        for name, value in dev.items():
+            if not value <= col_tol.get(name, tol):    #also catches nan
+                found.append('stage %d %s deviates by %.3g' % (stage, name, value))
+    return found
+
+#Evolves each star and saves the tracks, along with the model options, to a .npz file
+def reference_save(filename, masses, metallicities, **options):
+    tracks = {}
+    meta = {'options': options, 'stars': []}
+    for Z in grid_values(metallicities):
+        model = starpasta.StellarModel(Z, quiet=True, **options)
+        for M in grid_values(masses):
+            try:
+                data = model.sim_run(M)
+            except Exception as err:
+                meta['stars'].append({'M': M, 'Z': Z, 'error': type(err).__name__ + ': ' + str(err)})
+                continue
+            key = 'Z' + str(Z) + '_M' + str(M)
+            tracks[key] = data
+            meta['stars'].append({'M': M, 'Z': Z, 'key': key})
+    np.savez_compressed(filename, meta=json.dumps(meta), **tracks)
+    return meta
+
+#Reads back a reference file as its model options and a dict of tracks by (M, Z); stars that failed are given their error message instead
+def reference_load(filename):
+    with np.load(filename) as f:
+        meta = json.loads(str(f['meta']))
+        tracks = {}
+        for star in meta['stars']:
+            tracks[(star['M'], star['Z'])] = f[star['key']] if 'key' in star else star['error']
+    return meta['options'], tracks
+
+#Evolves every star in a reference file again with the current code and compares them
+#Returns a dict by (M, Z) of the compare_tracks result with its failures, or of an 'error' for stars that fail in only one of the two
+def check(filename, tol=default_tol, col_tol=None, **options):
+    ref_options, tracks = reference_load(filename)
+    ref_options.update(options)
+    models = {}
+    results = {}
+    for (M, Z), ref in sorted(tracks.items(), key=lambda item: (item[0][1], item[0][0])):
+        if Z not in models:
+            models[Z] = starpasta.StellarModel(Z, quiet=True, **ref_options)
+        try:
+            new = models[Z].sim_run(M)
+        except Exception as err:
+            new = type(err).__name__ + ': ' + str(err)
+        if isinstance(ref, str) or isinstance(new, str):
+            same = isinstance(ref, str) and isinstance(new, str)
+            results[(M, Z)] = {'error': new if isinstance(new, str) else None, 'ref_error': ref if isinstance(ref, str) else None,
+                               'failures': [] if same else ['fails in only one of the reference and the new run']}
+            continue
+        result = compare_tracks(ref, new)
+        result['failures'] = failures(result, tol, col_tol)
+        results[(M, Z)] = result
+    return results
+
+def report(results):
+    for (M, Z), result in results.items():
+        label = 'M = %g, Z = %g' % (M, Z)
+        if 'deviation' not in result:
+            print(label + ': ' + ('failed in both' if not result['failures'] else result['failures'][0]))
+            continue
+        print(label + ': ' + ('ok' if not result['failures'] else str(len(result['failures'])) + ' failures') + '  stages ' + '-'.join(map(str, result['new_stages'])))
+        for stage, dev in result['deviation'].items():
+            worst = max(dev, key=dev.get)
+            print('  stage %2d  max deviation %.3g (%s)%s' % (stage, dev[worst], worst, '  %d rows unmatched' % result['unmatched'][stage] if result['unmatched'][stage] else ''))
+        for failure in result['failures']:
+            print('  FAIL ' + failure)
+
+def main():
+    parser = argparse.ArgumentParser(description='Store reference tracks, or check that the current code reproduces them')
+    parser.add_argument('reference', help='reference .npz file')
+    parser.add_argument('--save', action='store_true', help='evolve the stars given by --mass and --Z and save them as the reference')
+    parser.add_argument('--mass', default='0.5,1,2,5,8,15,25,60,150', help='masses for --save: list (0.5,1,2) or lin:start:stop:num or log:start:stop:num')
+    parser.add_argument('--Z', default='0.0001,0.002,0.02', help='metallicities for --save, in the same format as --mass')
+    parser.add_argument('--tol', type=float, default=default_tol, help='relative tolerance for every column')
+    parser.add_argument('--tol-col', action='append', default=[], help='relative tolerance for one column, as name=value; can be repeated')
+    parser.add_argument('--no-mass-loss', action='store_true', help='turn off mass loss and small envelope adjustment when saving')
+    parser.add_argument('--full-LM', action='store_true', help='continue stars below 0.8 solar masses past the main sequence when saving')
+    parser.add_argument('--no-step-control', action='store_true', help='only shorten timesteps by halving rejected ones; when checking, overrides the reference')
+    args = parser.parse_args()
+
+    if args.save:
+        options = {'ML_on': not args.no_mass_loss, 'stop_LM': not args.full_LM, 'step_control': not args.no_step_control}
+        meta = reference_save(args.reference, args.mass, args.Z, **options)
+        print('Saved ' + str(len(meta['stars'])) + ' reference tracks to ' + args.reference)
+        return
+    col_tol = {}
+    for spec in args.tol_col:
+        name, _, value = spec.partition('=')
+        if name not in check_columns:
+            parser.error('--tol-col ' + spec + ': no column ' + repr(name) + '; the columns checked are ' + ', '.join(check_columns))
+        try:
+            col_tol[name] = float(value)
+        except ValueError:
+            parser.error('--tol-col ' + spec + ': the tolerance should be a number, as in ' + name + '=1e-3')
+    options = {'step_control': False} if args.no_step_control else {}
+    results = check(args.reference, args.tol, col_tol, **options)
+    report(results)
+    failed = [key for key, result in results.items() if result['failures']]
+    print(str(len(results) - len(failed)) + ' of ' + str(len(results)) + ' stars match the reference')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
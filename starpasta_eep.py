@@ -0,0 +1,141 @@
+import numpy as np
+
+import starpasta
+
+# Star Pasta Track Interpolation
+# Builds tracks for new masses and metallicities by interpolating between stored tracks at equivalent evolutionary points (EEPs)
+#
+# Each stage a track passes through (the stage codes 1-15 set by evolve) is a primary EEP, and within each stage the track is
+# resampled to a fixed number of secondary EEPs spaced evenly along its path in fractional stage time, log L and log R, so that
+# fast changes such as the MS hook or the end of the TPAGB get as many points as slow ones. Stage time is measured from the
+# start of the stage, in log time for remnants, which last up to 10^8 Myr. Two tracks can then be blended point by point
+# wherever they pass through the same stages.
+#
+# Example:
+#   tracks = starpasta_grid.grid_load('grid')
+#   grid = TrackGrid(tracks)
+#   data = grid.track(1.23, 0.012)     #same columns as sim_run
+
+remnant_tau = 0.1   #Myr; offset for the log spacing of remnant EEPs
+log_columns = [7, 8]    #L and R are blended in log space where both are positive
+
+#Position of each row within its stage, from 0 at the first row to 1 at the last
+def stage_fraction(stage, t):
+    dt = t - t[0]
+    if t[-1] == t[0]:
+        return np.linspace(0, 1, len(t))
+    if stage >= 10:
+        return np.log1p(dt / remnant_tau) / np.log1p(dt[-1] / remnant_tau)
+    return dt / dt[-1]
+
+#Inverse of stage_fraction for a stage starting at t0 and lasting dur
+def stage_time(stage, t0, dur, x):
+    if stage >= 10:
+        return t0 + remnant_tau * np.expm1(x * np.log1p(dur / remnant_tau))
+    return t0 + x * dur
+
+#Splits a sim_run track into its stages and resamples each to the given number of EEPs
+#Returns a list of (stage, rows, x) with rows shaped (points, columns) and x the fractional stage time of each EEP
+def eep_track(data, points=25):
+    segments = []
+    stages = data[:,1]
+    starts = np.concatenate([[0], np.nonzero(np.diff(stages))[0] + 1, [len(data)]])
+    s = np.linspace(0, 1, points)
+    for i0, i1 in zip(starts[:-1], starts[1:]):
+        rows = data[i0:i1]
+        stage = int(rows[0,1])
+        xr = stage_fraction(stage, rows[:,2])
+        logs = [np.log10(rows[:,col]) for col in log_columns if (rows[:,col] > 0).all()]
+        dist = np.sqrt(np.diff(xr)**2 + sum(np.diff(v)**2 for v in logs))
+        if len(rows) == 1 or dist.sum() == 0:
+            segments.append((stage, np.repeat(rows[:1], points, axis=0), np.linspace(0, 1, points)))
+            continue
+        sr = np.concatenate([[0], np.cumsum(dist)]) / dist.sum()
+        keep = np.concatenate([[True], dist > 0])     #drops repeated points, which np.interp can't use
+        eeps = np.empty([points, data.shape[1]])
+        for col in range(data.shape[1]):
+            v = rows[keep,col]
+            if col in log_columns and (v > 0).all():
+                eeps[:,col] = 10**np.interp(s, sr[keep], np.log10(v))
+            else:
+                eeps[:,col] = np.interp(s, sr[keep], v)
+        eeps[:,1] = stage
+        segments.append((stage, eeps, np.interp(s, sr[keep], xr[keep])))
+    return segments
+
+def blend(a, b, w, log=False):
+    if log and np.all(a > 0) and np.all(b > 0):
+        return 10**((1 - w) * np.log10(a) + w * np.log10(b))
+    return (1 - w) * a + w * b
+
+#Blends two EEP tracks with weight w on the second, over the stages they share in sequence
+#The start and end ages of each stage are blended in log space, so a stage ends where it would in both tracks for w = 0 or 1 and the
+#stages follow on in order between them, and each EEP is placed by its blended fractional stage time
+#Where the stage sequences part (e.g. different remnant types), the rest of the track is taken from the nearer of the two, shifted in time to follow on
+def eep_blend(sa, sb, w):
+    out = []
+    for (stage_a, ra, xa), (stage_b, rb, xb) in zip(sa, sb):
+        if stage_a != stage_b:
+            break
+        rows = np.empty_like(ra)
+        for col in range(ra.shape[1]):
+            rows[:,col] = blend(ra[:,col], rb[:,col], w, col in log_columns)
+        t0 = blend(ra[0,2], rb[0,2], w, True)
+        t1 = blend(ra[-1,2], rb[-1,2], w, True)
+        x = blend(xa, xb, w)
+        rows[:,2] = stage_time(stage_a, t0, t1 - t0, x)
+        rows[:,1] = stage_a
+        out.append((stage_a, rows, x))
+    nearer = sa if w < 0.5 else sb
+    if len(out) < len(nearer):
+        shift = out[-1][1][-1,2] - nearer[len(out) - 1][1][-1,2] if out else 0.0
+        for stage, rows, x in nearer[len(out):]:
+            rows = rows.copy()
+            rows[:,2] += shift
+            out.append((stage, rows, x))
+    return out
+
+#Turns EEP segments back into a sim_run style array, recomputing the derived columns
+def eep_data(segments):
+    data = np.concatenate([rows for stage, rows, x in segments])
+    data[:,0] = np.arange(len(data))
+    return starpasta.derive_columns(data)
+
+#Stored tracks, labelled with EEPs, that new tracks can be interpolated from
+class TrackGrid:
+    def __init__(self, tracks, points=25):
+        self.points = points
+        self.eeps = {}
+        self.masses = {}
+        for (M, Z), data in tracks.items():
+            self.eeps[(M, Z)] = eep_track(data, points)
+            self.masses.setdefault(Z, []).append(M)
+        for Z in self.masses:
+            self.masses[Z].sort()
+        self.metallicities = sorted(self.masses)
+
+    #EEP track for mass M at one of the grid metallicities, interpolated in log mass
+    def mass_segments(self, M, Z):
+        masses = self.masses[Z]
+        if M < masses[0] or M > masses[-1]:
+            raise ValueError('Mass ' + str(M) + ' is outside the grid at Z = ' + str(Z) + ' (' + str(masses[0]) + ' to ' + str(masses[-1]) + ')')
+        i = np.searchsorted(masses, M)
+        if masses[i] == M:
+            return self.eeps[(M, Z)]
+        lo, hi = masses[i-1], masses[i]
+        w = np.log10(M / lo) / np.log10(hi / lo)
+        return eep_blend(self.eeps[(lo, Z)], self.eeps[(hi, Z)], w)
+
+    #Interpolated track for mass M and metallicity Z, as an array with the sim_run columns
+    def track(self, M, Z):
+        Zs = self.metallicities
+        if Z < Zs[0] or Z > Zs[-1]:
+            raise ValueError('Metallicity ' + str(Z) + ' is outside the grid (' + str(Zs[0]) + ' to ' + str(Zs[-1]) + ')')
+        i = np.searchsorted(Zs, Z)
+        if Zs[i] == Z:
+            segments = self.mass_segments(M, Z)
+        else:
+            lo, hi = Zs[i-1], Zs[i]
+            w = np.log10(Z / lo) / np.log10(hi / lo)
+            segments = eep_blend(self.mass_segments(M, lo), self.mass_segments(M, hi), w)
+        return eep_data(segments)
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+import starpasta
+
+# Star Pasta Grid Runner
+# Evolves a grid of stars over mass and metallicity without any prompts, spreading the stars over a pool of worker processes
+# Each star is written to its own .csv as with the interactive script, and a manifest.csv summarises the whole grid
+#
+# Example, 200 masses at 10 metallicities:
+#   python starpasta_grid.py --mass log:0.08:300:200 --Z log:0.0001:0.03:10 --out grid
+
+manifest_fields = ['M', 'Z', 'file', 'steps', 'rejected', 'stage', 'mass', 'age', 'seconds', 'error']
+
+#Reads a grid axis: either a comma-separated list of values, or lin:start:stop:num / log:start:stop:num
+#The values are exact, so a star is evolved at the mass asked for; only the output file names are rounded (see name_value)
+def grid_values(spec):
+    if isinstance(spec, str):
+        kind, _, rest = spec.partition(':')
+        if kind in ('lin', 'log'):
+            start, stop, num = rest.split(':')
+            if kind == 'lin':
+                values = np.linspace(float(start), float(stop), int(num))
+            else:
+                values = np.geomspace(float(start), float(stop), int(num))     #with the ends exactly at start and stop
+        else:
+            values = [float(v) for v in spec.split(',')]
+    else:
+        values = spec
+    return [float(v) for v in values]
+
+#A grid value as written in output file names, to 6 significant figures so that linspace/logspace values stay readable
+def name_value(v):
+    return str(float('%.6g' % v))
+
+_models = {}    #models already built in this worker process, by metallicity and options
+
+def get_model(Z, options):
+    key = (Z, tuple(sorted(options.items())))
+    if key not in _models:
+        _models[key] = starpasta.StellarModel(Z, quiet=True, **options)
+    return _models[key]
+
+#Evolves and saves a single star; errors are recorded in the manifest rather than stopping the grid
+def run_star(job):
+    M, Z, folder, options, sampling, report = job
+    row = dict.fromkeys(manifest_fields, '')
+    row['M'] = M
+    row['Z'] = Z
+    start = time.perf_counter()
+    try:
+        model = get_model(Z, options)
+        data = model.sim_run(M, report=report, **sampling)
+        if report:
+            data, run_report = data
+            run_report.save(folder + 'Z' + name_value(Z) + '_M' + name_value(M) + '.json')
+        row['file'] = os.path.basename(starpasta.data_save(data, name_value(M), name_value(Z), folder))
+        row['steps'] = model.steps_accepted
+        row['rejected'] = model.steps_rejected
+        row['stage'] = int(data[-1,1])
+        row['mass'] = data[-1,3]
+        row['age'] = data[-1,2]
+    except Exception as err:
+        row['error'] = type(err).__name__ + ': ' + str(err)
+    row['seconds'] = round(time.perf_counter() - start, 4)
+    return row
+
+#Evolves every combination of masses and metallicities and returns the manifest rows
+#sampling holds the output sampling arguments for sim_run (ages, per_decade, per_stage or thin) and its stop conditions (max_age, stop_stage);
+#by default every timestep is saved
+#With report=True, each star's RunReport is saved as a .json alongside its .csv
+def grid_run(masses, metallicities, folder, processes=None, sampling=None, report=False, **options):
+    folder = os.path.join(folder, '')
+    os.makedirs(folder, exist_ok=True)
+    sampling = sampling or {}
+    jobs = [(M, Z, folder, options, sampling, report) for Z in grid_values(metallicities) for M in grid_values(masses)]
+    jobs.sort(key=lambda job: -job[0])  #high masses first, so that slow low-mass stars aren't all left to the end
+    if processes is None:
+        processes = os.cpu_count() or 1
+    rows = []
+    if processes > 1:
+        with mp.Pool(processes) as pool:
+            for row in pool.imap_unordered(run_star, jobs):
+                rows.append(row)
+    else:
+        rows = [run_star(job) for job in jobs]
+    rows.sort(key=lambda row: (row['Z'], row['M']))
+    with open(folder + 'manifest.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=manifest_fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+#Reads back a grid written by grid_run, as a dict of sim_run arrays by (M, Z); stars that failed are left out
+def grid_load(folder):
+    folder = os.path.join(folder, '')
+    tracks = {}
+    with open(folder + 'manifest.csv', newline='') as f:
+        for row in csv.DictReader(f):
+            if not row['error']:
+                tracks[(float(row['M']), float(row['Z']))] = np.loadtxt(folder + row['file'], delimiter=',', ndmin=2)
+    return tracks
+
+def main():
+    parser = argparse.ArgumentParser(description='Evolve a grid of stars over mass and metallicity')
+    parser.add_argument('--mass', required=True, help='masses: list (0.5,1,2) or lin:start:stop:num or log:start:stop:num')
+    parser.add_argument('--Z', required=True, help='metallicities, in the same format as --mass')
+    parser.add_argument('--out', default='grid', help='output folder for the .csv files and manifest')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes; defaults to the number of cores')
+    parser.add_argument('--no-mass-loss', action='store_true', help='turn off mass loss and small envelope adjustment')
+    parser.add_argument('--full-LM', action='store_true', help='continue stars below 0.8 solar masses past the main sequence')
+    parser.add_argument('--old-SN', action='store_true', help='use the Hurley et al. 2000 remnant masses instead of F2012')
+    parser.add_argument('--no-step-control', action='store_true', help='only shorten timesteps by halving rejected ones, as in earlier versions')
+    parser.add_argument('--remnant-grid', type=float, default=None, help='fill in remnant tracks at once at this many points per decade of age')
+    parser.add_argument('--ages', default=None, help='save each star only at these ages in Myr, in the same format as --mass')
+    parser.add_argument('--per-decade', type=float, default=None, help='save each star at this many ages per decade, evenly in log age')
+    parser.add_argument('--per-stage', type=int, default=None, help='save each star at this many points spread over each stage')
+    parser.add_argument('--thin', action='store_true', help='save only the timesteps needed to interpolate the rest to within starpasta.thin_tol')
+    parser.add_argument('--max-age', type=float, default=None, help='stop each star at this age in Myr')
+    parser.add_argument('--stop-stage', type=int, default=None, help='stop each star once it reaches this stage, e.g. 10 for the first remnant')
+    parser.add_argument('--report', action='store_true', help='save a .json of steps, retries, solver iterations, clamps and time per stage for each star')
+    parser.add_argument('--cache', default=None, help='folder of a track cache shared by the workers, so stars run before are read back rather than evolved')
+    parser.add_argument('--clear-cache', action='store_true', help='empty the --cache folder first, including the entries of older versions of the code')
+    args = parser.parse_args()
+
+    options = {'ML_on': not args.no_mass_loss, 'stop_LM': not args.full_LM, 'fast_SN': not args.old_SN, 'step_control': not args.no_step_control,
+               'remnant_grid': args.remnant_grid, 'track_cache': args.cache}
+    if args.clear_cache and args.cache:
+        starpasta.TrackCache(args.cache).clear()
+    if args.ages:
+        sampling = {'ages': grid_values(args.ages)}
+    else:
+        sampling = {'per_decade': args.per_decade, 'per_stage': args.per_stage, 'thin': args.thin}
+    sampling.update(max_age=args.max_age, stop_stage=args.stop_stage)
+    start = time.perf_counter()
+    rows = grid_run(args.mass, args.Z, args.out, args.processes, sampling, args.report, **options)
+    failed = [row for row in rows if row['error']]
+    print('Evolved ' + str(len(rows)) + ' stars in ' + str(round(time.perf_counter() - start, 2)) + ' s')
+    if failed:
+        print(str(len(failed)) + ' failed; see manifest.csv')
+    print('Output saved to ' + os.path.join(args.out, ''))
+
+if __name__ == '__main__':
+    main()
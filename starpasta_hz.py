@@ -0,0 +1,149 @@
+import argparse
+import csv
+
+import numpy as np
+
+import starpasta
+from starpasta_grid import grid_values
+
+# Star Pasta Habitable Zone Occupancy
+# Follows planets on many orbits through a finished track at once, with the K2014 habitable zones for planets of 0.1, 1 and 5 Earth masses
+#
+# For each semimajor axis it finds the instellation over time, the total and the longest continuous time spent in each HZ, and the time
+# at which the star's radius first reaches the orbit. The optimistic HZ runs from the recent Venus to the early Mars limit, and the
+# conservative HZ from the runaway greenhouse limit (which depends on the planet's mass) to the maximum greenhouse limit
+#
+# The star is taken to hold the state of each row until the next, as in the "Single Output" box of starpasta_out. A planet no longer
+# counts as in the HZ once it has been engulfed
+#
+# Example:
+#   data = model.sim_run(1.0)
+#   hz = hz_occupancy(data, np.logspace(-2, 1, 10000))
+#   hz['conservative']['total'][1]      #Myr in the conservative HZ of a 1 Earth mass planet, for each orbit
+#
+# or from the command line:
+#   python starpasta_hz.py --M 1 --Z 0.02 --a log:0.01:10:10000 --out hz.csv
+
+au = 215.032    #solar radii per AU
+hz_definitions = ['optimistic', 'conservative']
+planet_masses = [0.1, 1, 5]    #Earth masses with K2014 coefficients
+chunk_cells = 2**22     #rows x orbits worked on at once when finding continuous times, to bound memory
+
+#Inner and outer distances (AU) of an HZ for a star of luminosity L and temperature Teff, as in data_add
+def hz_bounds(L, Teff, definition='conservative', planet_mass=1):
+    THZ = np.clip(Teff, 2600, 7200)
+    if definition == 'optimistic':
+        inner, outer = starpasta.hz_recent_venus, starpasta.hz_early_mars
+    elif definition == 'conservative':
+        inner, outer = starpasta.hz_runaway[planet_mass], starpasta.hz_max_greenhouse
+    else:
+        raise ValueError('unknown HZ ' + repr(definition) + '; use optimistic or conservative')
+    return starpasta.f_HZ(L, THZ, *inner), starpasta.f_HZ(L, THZ, *outer)
+
+#L and Teff of each row, with Teff set to 0 where the star has no radius (stages 0 and 15)
+def track_L_Teff(data):
+    L = data[:,7]
+    R = data[:,8]
+    Teff = np.zeros(len(data))
+    lit = (R > 0) & (L > 0)
+    Teff[lit] = 5778 * np.sqrt(np.sqrt(L[lit]) / R[lit])
+    return np.where(lit, L, 0.0), Teff
+
+#Instellation in units of the Earth's (L / a^2) for each row and each semimajor axis a in AU; shaped (rows, orbits)
+def instellation(data, a):
+    return data[:,7,None] / np.asarray(a, dtype=float)[None,:]**2
+
+#Age at which the star's radius first reaches each orbit, or nan if it never does
+def engulfment(data, a):
+    a = np.asarray(a, dtype=float)
+    reach = np.maximum.accumulate(data[:,8]) / au
+    i = np.searchsorted(reach, a, side='left')
+    out = np.full(a.shape, np.nan)
+    hit = i < len(data)
+    out[hit] = data[i[hit],2]
+    return out
+
+#Total time each orbit spends between the distances lo and hi (AU) of each interval of length dt, in O(rows + orbits)
+#Each interval adds its dt to every orbit it covers, through a running sum over the sorted orbits
+def covered_time(a_sorted, lo, hi, dt):
+    i0 = np.searchsorted(a_sorted, lo, side='left')
+    i1 = np.searchsorted(a_sorted, hi, side='right')
+    ok = i1 > i0
+    diff = np.zeros(len(a_sorted) + 1)
+    np.add.at(diff, i0[ok], dt[ok])
+    np.add.at(diff, i1[ok], -dt[ok])
+    return np.cumsum(diff[:-1])
+
+#Longest unbroken time each orbit spends between lo and hi, working through the orbits in chunks
+#Runs of intervals that cover the same orbits are merged first, since they can only lengthen or break a stretch together
+def continuous_time(a_sorted, lo, hi, dt):
+    out = np.zeros(len(a_sorted))
+    i0 = np.searchsorted(a_sorted, lo, side='left')
+    i1 = np.maximum(np.searchsorted(a_sorted, hi, side='right'), i0)
+    new = np.concatenate([[True], (i0[1:] != i0[:-1]) | (i1[1:] != i1[:-1])])
+    first = np.nonzero(new)[0]
+    i0, i1 = i0[first], i1[first]
+    end = np.cumsum(dt)[np.append(first[1:] - 1, len(dt) - 1)] if len(dt) else np.zeros(0)    #time at the end of each merged interval
+    j = np.arange(len(a_sorted))
+    step = max(1, chunk_cells // max(1, len(end)))
+    for j0 in range(0, len(a_sorted), step):
+        jj = j[None,j0:j0+step]
+        inside = (jj >= i0[:,None]) & (jj < i1[:,None])
+        start = np.maximum.accumulate(np.where(inside, 0.0, end[:,None]), axis=0)   #end of the last interval outside the HZ
+        run = np.where(inside, end[:,None] - start, 0.0)
+        out[j0:j0+step] = run.max(axis=0) if len(end) else 0.0
+    return out
+
+#Finds, for every semimajor axis in a (AU) and every planet mass in masses (Earth masses, from planet_masses):
+#  engulfed     - age (Myr) at which the star's radius first reaches the orbit, or nan
+#  and for each of hz_definitions, arrays shaped (masses, orbits):
+#    total      - Myr spent in the HZ
+#    continuous - longest unbroken stretch in the HZ, in Myr
+#The instellation itself, which is (rows, orbits), is left to instellation()
+def hz_occupancy(data, a, masses=planet_masses):
+    a = np.asarray(a, dtype=float)
+    order = np.argsort(a)
+    a_sorted = a[order]
+    L, Teff = track_L_Teff(data[:-1])
+    dt = np.diff(data[:,2])
+    reach = np.maximum.accumulate(data[:-1,8]) / au     #orbits at or inside this have already been engulfed
+    out = {'a': a, 'planet_masses': list(masses), 'engulfed': engulfment(data, a)}
+    for definition in hz_definitions:
+        total = np.zeros([len(masses), len(a)])
+        continuous = np.zeros([len(masses), len(a)])
+        for k, mass in enumerate(masses):
+            lo, hi = hz_bounds(L, Teff, definition, mass)
+            lo = np.maximum(lo, np.nextafter(reach, np.inf))
+            total[k, order] = covered_time(a_sorted, lo, hi, dt)
+            continuous[k, order] = continuous_time(a_sorted, lo, hi, dt)
+        out[definition] = {'total': total, 'continuous': continuous}
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description='Time spent in the habitable zone by planets on many orbits around one star')
+    parser.add_argument('--M', type=float, required=True, help='initial mass of the star')
+    parser.add_argument('--Z', type=float, required=True, help='metallicity')
+    parser.add_argument('--a', default='log:0.01:10:1000', help='semimajor axes in AU: list (0.5,1,2) or lin:start:stop:num or log:start:stop:num')
+    parser.add_argument('--max-age', type=float, default=None, help='stop the star at this age in Myr')
+    parser.add_argument('--out', default='hz.csv', help='output .csv file')
+    args = parser.parse_args()
+
+    model = starpasta.StellarModel(args.Z, quiet=True)
+    data = model.sim_run(args.M, max_age=args.max_age)
+    a = np.array(grid_values(args.a))
+    hz = hz_occupancy(data, a)
+    fields = ['a', 'engulfed']
+    values = [a, hz['engulfed']]
+    for definition in hz_definitions:
+        for k, mass in enumerate(hz['planet_masses']):
+            for kind in ('total', 'continuous'):
+                fields.append(definition + '_' + kind + '_' + str(mass) + 'ME')
+                values.append(hz[definition][kind][k])
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows(np.column_stack(values))
+    print('Output saved to ' + args.out)
+
+if __name__ == '__main__':
+    main()
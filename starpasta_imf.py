@@ -0,0 +1,44 @@
+import functools
+
+import numpy as np
+
+# Star Pasta Initial Mass Functions
+# The IMFs that starpasta_pop draws masses from and starpasta_sfh weights its grid of tracks by, kept apart from both so that
+# starpasta_ensemble can draw masses too without importing starpasta_pop
+#
+# Example:
+#   masses = sample_masses(np.random.default_rng(1), 100000, 'kroupa', 0.08, 150)
+
+##############################################################################################################
+
+# Initial Mass Functions
+
+#Number of stars per unit log mass, unnormalized
+#  salpeter - Salpeter 1955, dN/dm ~ m^-2.35
+#  kroupa   - Kroupa 2001, dN/dm ~ m^-0.3 below 0.08, m^-1.3 from 0.08 to 0.5 and m^-2.3 above
+#  chabrier - Chabrier 2003 for single stars, lognormal below 1 Msun and dN/dm ~ m^-2.3 above
+def imf_dlogm(imf, m):
+    m = np.asarray(m, dtype=float)
+    if imf == 'salpeter':
+        dndm = m**-2.35
+    elif imf == 'kroupa':
+        dndm = np.where(m < 0.08, (m / 0.08)**-0.3 * (0.08 / 0.5)**-1.3, np.where(m < 0.5, (m / 0.5)**-1.3, (m / 0.5)**-2.3))
+    elif imf == 'chabrier':
+        lognormal = 0.158 * np.exp(-(np.log10(m) - np.log10(0.079))**2 / (2 * 0.69**2))     #eq 17 from Chabrier 2003, per log m
+        return np.where(m <= 1, lognormal, 0.0443 * m**-1.3)
+    else:
+        raise ValueError('unknown IMF ' + repr(imf) + '; use salpeter, kroupa or chabrier')
+    return dndm * m
+
+#Cumulative distribution of the IMF tabulated in log mass, for drawing masses by inverting it
+@functools.lru_cache(maxsize=None)
+def imf_table(imf, mmin, mmax, points=4097):
+    logm = np.linspace(np.log10(mmin), np.log10(mmax), points)
+    pdf = imf_dlogm(imf, 10**logm)
+    cdf = np.concatenate([[0], np.cumsum((pdf[1:] + pdf[:-1]) / 2 * np.diff(logm))])
+    return cdf / cdf[-1], logm
+
+#Draws n initial masses between mmin and mmax from the IMF
+def sample_masses(rng, n, imf='kroupa', mmin=0.08, mmax=150):
+    cdf, logm = imf_table(imf, mmin, mmax)
+    return 10**np.interp(rng.random(n), cdf, logm)
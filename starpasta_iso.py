@@ -0,0 +1,148 @@
+import argparse
+import csv
+
+import numpy as np
+
+import starpasta
+from starpasta_grid import grid_values
+from starpasta_query import Track
+
+# Star Pasta Isochrones
+# Finds the state of stars of many masses at one or more ages for a single metallicity
+#
+# Where a star's state can't depend on its mass loss history, the stage functions are evaluated directly at the requested age:
+#   - with mass loss off, every stage up to the start of the TPAGB
+#   - with mass loss on, the main sequence and Hertzsprung gap of stars that haven't started losing mass
+# Everything else (mass-losing stars, naked helium stars and remnants) is read off a full track from sim_run, evolved once per mass
+# and interpolated at each age, so one call can serve any number of ages
+#
+# Example:
+#   python starpasta_iso.py --Z 0.02 --age 100,1000,10000 --mass log:0.1:100:500 --out iso.csv
+
+iso_columns = ['age', 'M', 'stage', 'mt', 'Mc', 'McCO', 'L', 'R', 'Teff']
+
+#True for each mass whose main sequence has no mass loss, checked at the ZAMS and TAMS
+def windless_ms(model, masses, tMS):
+    LZ, RZ = model.main_seq_v(masses, 0.0)
+    LT, RT = model.main_seq_v(masses, tMS)
+    windless = np.empty(len(masses), dtype=bool)
+    for j, m in enumerate(masses.tolist()):
+        windless[j] = model.mass_loss(m, 0.0, 0.0, LZ[j], RZ[j], 1) == 0 and model.mass_loss(m, 0.0, 0.0, LT[j], RT[j], 1) == 0
+    return windless
+
+#Post-MS state of a star of initial mass m at age t, computed directly from the stage functions, assuming it has lost no mass
+#Returns stage, L, R, Mc, McCO, or None if the state depends on the star's history and must be taken from a track
+def direct_state(model, m, t):
+    model.cache_mass(m)
+    if m > model.MFGB:
+        tBGB = model.f_tHeI(m)
+    else:
+        tBGB = model.f_tBGB(m)
+    if t < tBGB:
+        L, R, Mc = model.hertz_gap(m, m, t)
+        McCO = 0.0
+        stage = 2
+    elif not model.ML_on:
+        tHeI = model.f_tHeI(m)
+        McBAGB = model.f_McBAGB(m)
+        tHe = model.f_tHe(m, model.f_tBGB(m), McBAGB)
+        if m <= model.MFGB and t < tHeI:
+            L, R, Mc = model.giant_branch(m, m, t)
+            McCO = 0.0
+            stage = 3
+        elif t < tHeI + tHe:
+            L, R, Mc = model.core_he_burn(m, m, t, model.f_McHeI(m), 1e-10)     #solved from the core mass at He ignition
+            McCO = 0.0
+            stage = 4
+        elif McBAGB <= 2.25:
+            #Only the EAGB up to second dredge-up is taken directly; the TPAGB, and the EAGB of stars that skip it, end when the core
+            #reaches McSN or the envelope, and past that point the core mass formulae no longer hold, so that has to be found by stepping
+            try:
+                L, R, Mc, McCO, late = model.Asymptotic(m, m, t)
+            except (TypeError, ValueError):     #complex core masses well past the end of the AGB
+                return None
+            if late or Mc >= m or McCO >= model.f_McSN(McBAGB):
+                return None
+            stage = 5
+        else:
+            return None
+        return stage, L, R, Mc, McCO
+    else:
+        return None
+    L1, R1, Rcr = model.small_env(m, m, Mc, McCO, L, R, stage, t)
+    if model.ML_on and (model.mass_loss(m, Mc, McCO, L1, R1, stage) > 0 or (L1, R1) != (L, R)):
+        return None
+    return stage, L, R, Mc, McCO
+
+#Returns a dict of arrays with shape (ages, masses) for each of iso_columns, plus 'direct' marking which values came straight from the stage functions
+#tracks is an optional dict of sim_run outputs by mass for this model; missing tracks are evolved and added to it, so it can be reused between calls
+def isochrone(model, ages, masses, tracks=None):
+    ages = np.atleast_1d(np.asarray(ages, dtype=float))
+    masses = np.atleast_1d(np.asarray(masses, dtype=float))
+    if tracks is None:
+        tracks = {}
+    shape = (len(ages), len(masses))
+    out = {name: np.zeros(shape) for name in iso_columns}
+    A, M = np.meshgrid(ages, masses, indexing='ij')
+    out['age'][:] = A
+    out['M'][:] = M
+    out['mt'][:] = M
+
+    tMS = model.f_tMS_v(masses)
+    if model.ML_on:
+        windless = windless_ms(model, masses, tMS)
+    else:
+        windless = np.ones(len(masses), dtype=bool)
+
+    direct = (A < tMS) & windless
+    out['L'][direct], out['R'][direct] = model.main_seq_v(M[direct], A[direct])
+    out['stage'][direct] = 1
+    if model.stop_LM:   #matches the stage 0 rows that end these tracks
+        done = (A >= tMS) & (M < 0.8)
+        out['stage'][done] = 0
+        direct |= done
+
+    for i, j in zip(*np.nonzero(~direct & windless)):
+        state = direct_state(model, float(masses[j]), float(ages[i]))     #numpy scalars would turn the complex intermediates in CHeB into nan
+        if state is not None:
+            out['stage'][i,j], out['L'][i,j], out['R'][i,j], out['Mc'][i,j], out['McCO'][i,j] = state
+            direct[i,j] = True
+
+    for j in np.nonzero(~direct.all(axis=0))[0]:
+        m = float(masses[j])
+        if m not in tracks:
+            tracks[m] = model.sim_run(m)
+        need = ~direct[:,j]
+        rows = Track(tracks[m]).at(ages[need])
+        out['stage'][need,j] = rows[:,1]
+        out['mt'][need,j] = rows[:,3]
+        out['Mc'][need,j] = rows[:,4]
+        out['McCO'][need,j] = rows[:,5]
+        out['L'][need,j] = rows[:,7]
+        out['R'][need,j] = rows[:,8]
+
+    lit = out['R'] > 0
+    out['Teff'][lit] = 5778 * (np.sqrt(out['L'][lit]) / out['R'][lit])**0.5
+    out['direct'] = direct
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute isochrones: the state of stars of many masses at fixed ages')
+    parser.add_argument('--Z', type=float, required=True, help='metallicity')
+    parser.add_argument('--age', required=True, help='ages in Myr: list (100,1000) or lin:start:stop:num or log:start:stop:num')
+    parser.add_argument('--mass', default='log:0.1:100:500', help='initial masses, in the same format as --age')
+    parser.add_argument('--out', default='isochrone.csv', help='output .csv file')
+    parser.add_argument('--no-mass-loss', action='store_true', help='turn off mass loss and small envelope adjustment')
+    args = parser.parse_args()
+
+    model = starpasta.StellarModel(args.Z, ML_on=not args.no_mass_loss, quiet=True)
+    iso = isochrone(model, grid_values(args.age), grid_values(args.mass))
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(iso_columns)
+        writer.writerows(np.column_stack([iso[name].ravel() for name in iso_columns]))
+    print('Evaluated ' + str(iso['direct'].size) + ' points, ' + str(int(iso['direct'].sum())) + ' directly from the stage functions')
+    print('Output saved to ' + args.out)
+
+if __name__ == '__main__':
+    main()
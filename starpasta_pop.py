@@ -0,0 +1,173 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+import starpasta
+from starpasta_grid import get_model, grid_values
+from starpasta_imf import sample_masses
+from starpasta_query import Track
+
+# Star Pasta Population Synthesis
+# Evolves a population of stars with initial masses drawn from an IMF, at one or more metallicities, spread over a pool of worker processes
+#
+# Tracks aren't kept: each worker draws and evolves a chunk of stars and adds them straight into a Population of histograms,
+# which are summed as the chunks come back, so memory stays the same however many stars are evolved. For each metallicity and
+# each requested age it counts:
+#   - the stars in each stage (0-15)
+#   - the mass functions of white dwarfs (stages 10-12), neutron stars (13) and black holes (14) formed by that age, and of the stars
+#     that have left no remnant (15), which having no remnant mass are binned by their initial mass
+#   - the luminosity functions of fusing stars (stages 1-9) and of white dwarfs
+# Every chunk has its own seed, spawned from the population seed, so the result doesn't depend on the number of processes
+#
+# Example, a million stars at two metallicities:
+#   python starpasta_pop.py --n 1000000 --Z 0.002,0.02 --imf kroupa --age 10,100,1000,10000 --out pop.npz
+
+remnant_types = ['WD', 'NS', 'BH', 'none']
+remnant_stages = [(10, 13), (13, 14), (14, 15), (15, 16)]     #range of stage codes for each of remnant_types
+default_mass_bins = np.logspace(-1.5, 2.5, 81)     #Msun, for the initial and remnant mass functions
+default_L_bins = np.linspace(-6, 7, 131)            #log L/Lsun, for the luminosity functions
+
+##############################################################################################################
+
+# Reduction
+
+#Histograms of a population, for each metallicity and age
+#Values beyond the ends of the bins are counted in the end bins, so no stars are lost from the totals
+class Population:
+    counts = ['stars', 'failed', 'initial_mf', 'stage_counts', 'remnant_mf', 'LF', 'WD_LF']     #arrays that are summed by merge
+
+    def __init__(self, metallicities, ages, mass_bins=None, L_bins=None):
+        self.metallicities = list(metallicities)
+        self.ages = np.asarray(ages, dtype=float)
+        self.mass_bins = default_mass_bins if mass_bins is None else np.asarray(mass_bins, dtype=float)
+        self.L_bins = default_L_bins if L_bins is None else np.asarray(L_bins, dtype=float)
+        nZ, nA, nM, nL = len(self.metallicities), len(self.ages), len(self.mass_bins) - 1, len(self.L_bins) - 1
+        self.stars = np.zeros(nZ, dtype=np.int64)
+        self.failed = np.zeros(nZ, dtype=np.int64)
+        self.initial_mf = np.zeros([nZ, nM], dtype=np.int64)
+        self.stage_counts = np.zeros([nZ, nA, 16], dtype=np.int64)
+        self.remnant_mf = np.zeros([nZ, nA, len(remnant_types), nM], dtype=np.int64)
+        self.LF = np.zeros([nZ, nA, nL], dtype=np.int64)
+        self.WD_LF = np.zeros([nZ, nA, nL], dtype=np.int64)
+
+    def bin(self, bins, values):
+        return np.clip(np.searchsorted(bins, values, side='right') - 1, 0, len(bins) - 2)
+
+    #Adds one star of initial mass M with its sim_run track, or a failed star if data is None
+    def add(self, Zi, M, data):
+        self.stars[Zi] += 1
+        self.initial_mf[Zi, self.bin(self.mass_bins, M)] += 1
+        if data is None:
+            self.failed[Zi] += 1
+            return
+        rows = Track(data).at(self.ages)
+        stage = rows[:,1].astype(int)
+        a = np.arange(len(self.ages))
+        self.stage_counts[Zi, a, stage] += 1
+        for k, (lo, hi) in enumerate(remnant_stages):
+            now = (stage >= lo) & (stage < hi)
+            mass = np.full(now.sum(), M) if remnant_types[k] == 'none' else rows[now,3]
+            self.remnant_mf[Zi, a[now], k, self.bin(self.mass_bins, mass)] += 1
+        lit = rows[:,7] > 0
+        logL = np.log10(rows[lit,7])
+        fusing = (stage[lit] >= 1) & (stage[lit] <= 9)
+        wd = (stage[lit] >= 10) & (stage[lit] <= 12)
+        self.LF[Zi, a[lit][fusing], self.bin(self.L_bins, logL[fusing])] += 1
+        self.WD_LF[Zi, a[lit][wd], self.bin(self.L_bins, logL[wd])] += 1
+
+    def merge(self, other):
+        for name in self.counts:
+            getattr(self, name)[...] += getattr(other, name)
+        return self
+
+    def save(self, filename):
+        np.savez_compressed(filename, metallicities=self.metallicities, ages=self.ages, mass_bins=self.mass_bins, L_bins=self.L_bins,
+                            stars=self.stars, failed=self.failed, initial_mf=self.initial_mf, stage_counts=self.stage_counts,
+                            remnant_mf=self.remnant_mf, LF=self.LF, WD_LF=self.WD_LF, remnant_types=remnant_types)
+        return filename
+
+##############################################################################################################
+
+# Driver
+
+#Draws and evolves one chunk of stars, returning their histograms
+def run_chunk(job):
+    Zi, metallicities, n, seed, imf, mmin, mmax, ages, mass_bins, L_bins, options = job
+    pop = Population(metallicities, ages, mass_bins, L_bins)
+    model = get_model(metallicities[Zi], options)
+    masses = sample_masses(np.random.default_rng(seed), n, imf, mmin, mmax).tolist()
+    for M in masses:
+        try:
+            data = model.sim_run(M)
+        except Exception:
+            data = None
+        pop.add(Zi, M, data)
+    return pop
+
+#Evolves n stars at each metallicity and returns the Population of them all
+#Stars are drawn and evolved in chunks of chunk stars; progress is called with the number of stars done so far after each chunk
+def population(n, metallicities, ages, imf='kroupa', mmin=0.08, mmax=150, seed=None, processes=None, chunk=1000,
+               mass_bins=None, L_bins=None, progress=None, **options):
+    metallicities = grid_values(metallicities)
+    ages = grid_values(ages)
+    pop = Population(metallicities, ages, mass_bins, L_bins)
+    seeds = np.random.SeedSequence(seed).spawn(len(metallicities))
+    jobs = []
+    for Zi in range(len(metallicities)):
+        sizes = [chunk] * (n // chunk) + ([n % chunk] if n % chunk else [])
+        for size, s in zip(sizes, seeds[Zi].spawn(len(sizes))):
+            jobs.append((Zi, metallicities, size, s, imf, mmin, mmax, ages, pop.mass_bins, pop.L_bins, options))
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes > 1:
+        pool = mp.Pool(processes)
+        parts = pool.imap_unordered(run_chunk, jobs)
+    else:
+        pool = None
+        parts = map(run_chunk, jobs)
+    try:
+        for part in parts:
+            pop.merge(part)
+            if progress:
+                progress(int(pop.stars.sum()))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return pop
+
+def main():
+    parser = argparse.ArgumentParser(description='Evolve a population of stars drawn from an IMF and count them by stage, remnant and luminosity')
+    parser.add_argument('--n', type=int, required=True, help='number of stars at each metallicity')
+    parser.add_argument('--Z', required=True, help='metallicities: list (0.002,0.02) or lin:start:stop:num or log:start:stop:num')
+    parser.add_argument('--age', required=True, help='ages in Myr at which to count the population, in the same format as --Z')
+    parser.add_argument('--imf', default='kroupa', choices=['salpeter', 'kroupa', 'chabrier'], help='initial mass function')
+    parser.add_argument('--mmin', type=float, default=0.08, help='lowest initial mass')
+    parser.add_argument('--mmax', type=float, default=150, help='highest initial mass')
+    parser.add_argument('--seed', type=int, default=None, help='seed for drawing the masses')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes; defaults to the number of cores')
+    parser.add_argument('--chunk', type=int, default=1000, help='stars drawn and evolved together by each worker')
+    parser.add_argument('--out', default='population.npz', help='output .npz file of histograms')
+    parser.add_argument('--no-mass-loss', action='store_true', help='turn off mass loss and small envelope adjustment')
+    parser.add_argument('--full-LM', action='store_true', help='continue stars below 0.8 solar masses past the main sequence')
+    parser.add_argument('--remnant-grid', type=float, default=None, help='fill in remnant tracks at once at this many points per decade of age')
+    args = parser.parse_args()
+
+    options = {'ML_on': not args.no_mass_loss, 'stop_LM': not args.full_LM, 'remnant_grid': args.remnant_grid}
+    start = time.perf_counter()
+    pop = population(args.n, args.Z, args.age, args.imf, args.mmin, args.mmax, args.seed, args.processes, args.chunk, **options)
+    print('Evolved ' + str(int(pop.stars.sum())) + ' stars in ' + str(round(time.perf_counter() - start, 2)) + ' s')
+    if pop.failed.any():
+        print(str(int(pop.failed.sum())) + ' failed')
+    for Zi, Z in enumerate(pop.metallicities):
+        print('Z = ' + str(Z))
+        print('%12s' % 'age (Myr)' + ''.join('%9d' % stage for stage in range(16)))
+        for Ai, age in enumerate(pop.ages):
+            print('%12g' % age + ''.join('%9d' % count for count in pop.stage_counts[Zi, Ai]))
+    print('Output saved to ' + pop.save(args.out))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import numpy as np
+
+import starpasta
+
+# Star Pasta Track Queries
+# Looks up the state of a star at any age from a computed track, interpolating linearly between the two nearest timesteps
+# as the "Single Output" box of starpasta_out does, but for whole arrays of ages at once
+#
+# Example:
+#   track = Track(model.sim_run(1.0))
+#   rows = track.at(np.logspace(0, 4, 1000000))          #one row per age, with the sim_run columns
+#   L = track.at(ages, 'L')                               #or a single column
+#   rows = track.at(ages, stage=4)                        #only within core helium burning; nan outside it
+
+#A sim_run track indexed by stage, for fast lookups by age
+class Track:
+    def __init__(self, data):
+        self.data = data
+        self.t = data[:,2]
+        stages = data[:,1]
+        starts = np.concatenate([[0], np.nonzero(np.diff(stages))[0] + 1])
+        stops = np.concatenate([starts[1:], [len(data)]])
+        self.stages = {}    #first and last+1 row of each stage
+        for i0, i1 in zip(starts, stops):
+            self.stages.setdefault(int(stages[i0]), (int(i0), int(i1)))
+
+    #Start and end age of a stage, or None if the star never reaches it
+    def stage_span(self, stage):
+        if stage not in self.stages:
+            return None
+        i0, i1 = self.stages[stage]
+        return self.t[i0], self.t[i1-1]
+
+    #Interpolates the track at the given ages (clamped to the ends of the track)
+    #The stage is that of the last step at or before each age
+    #column picks out one column by name or index; stage limits the lookup to that stage's rows, giving nan for ages outside it
+    def at(self, ages, column=None, stage=None):
+        ages = np.asarray(ages, dtype=float)
+        if stage is None:
+            i0, i1 = 0, len(self.data)
+        elif stage in self.stages:
+            i0, i1 = self.stages[stage]
+        else:
+            i0, i1 = 0, 0
+        if isinstance(column, str):
+            column = starpasta.columns.index(column)
+        shape = ages.shape if column is not None else ages.shape + (self.data.shape[1],)
+        if i1 == i0:
+            return np.full(shape, np.nan)
+
+        data = self.data[i0:i1] if column is None else self.data[i0:i1,column]
+        t = self.t[i0:i1]
+        i = np.clip(np.searchsorted(t, ages, side='right') - 1, 0, len(t) - 1)
+        j = np.minimum(i + 1, len(t) - 1)
+        gap = t[j] - t[i]
+        f = np.clip(np.divide(ages - t[i], gap, out=np.zeros(ages.shape), where=gap > 0), 0, 1)
+        if column is None:
+            f = f[...,None]
+        rows = data[i] + (data[j] - data[i]) * f
+        if column is None:
+            rows[...,1] = data[i,1]
+        elif column == 1:
+            rows = data[i]
+        if stage is not None:
+            outside = (ages < t[0]) | (ages > t[-1])
+            rows[outside] = np.nan
+        return rows
+
+#Looks up the same ages in several tracks; returns an array shaped (tracks, ages, columns), or (tracks, ages) for one column
+def query(tracks, ages, column=None, stage=None):
+    return np.stack([(track if isinstance(track, Track) else Track(track)).at(ages, column, stage) for track in tracks])
@@ -0,0 +1,175 @@
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+import starpasta
+from starpasta_grid import get_model, grid_values
+from starpasta_imf import imf_dlogm
+from starpasta_query import Track
+
+# Star Pasta Star Formation Histories
+# Finds the state of a population with any star formation history, from the response to a single burst of star formation
+#
+# The burst response is built once from a grid of tracks spread over the IMF: for 1 Msun of stars formed at t = 0, the number of
+# stars in each stage at each age, and the number of supernovae of each kind (starpasta.sn_events) in each age bin. A population
+# formed at a varying rate is then the convolution of the response with its star formation history, done with FFTs, so one
+# grid of tracks serves any number of star formation histories without evolving any more stars
+#
+# Example:
+#   python starpasta_sfh.py build --Z 0.02 --dt 10 --bins 1400 --out burst.npz
+#   python starpasta_sfh.py apply burst.npz --sfh sfh.csv --out history.csv
+# where sfh.csv holds the star formation rate in Msun/Myr over each bin of dt Myr, oldest first
+
+remnant_census = {'WD': (10, 13), 'NS': (13, 14), 'BH': (14, 15)}     #range of stage codes for each kind of remnant
+
+#Response of a population to a single burst forming 1 Msun of stars at t = 0, in bins of dt Myr
+#  stages  - (bins, 16) number of stars in each stage at each age k*dt
+#  events  - (bins, len(starpasta.sn_events)) number of supernovae of each kind over each age bin from k*dt to (k+1)*dt
+#  failed  - number of stars per Msun formed whose tracks couldn't be evolved, and so are missing from the counts
+class Burst:
+    def __init__(self, dt, stages, events, Z=None, failed=0.0):
+        self.dt = float(dt)
+        self.stages = np.asarray(stages, dtype=float)
+        self.events = np.asarray(events, dtype=float)
+        self.Z = Z
+        self.failed = failed
+
+    def __len__(self):
+        return len(self.stages)
+
+    #Ages at which stages are counted, and the start of each event bin
+    def ages(self):
+        return np.arange(len(self)) * self.dt
+
+    #Population formed at the rates in sfh (Msun/Myr over each bin of dt, oldest first; several histories can be given as rows of a 2D array)
+    #Stars formed over a bin are all counted from its start, so the state at the start of each bin includes the stars formed over it
+    #Returns a dict of arrays with time along the last axis but one:
+    #  t                - time at the start of each bin, from the start of star formation
+    #  stages           - number of stars in each stage
+    #  WD, NS, BH       - number of each kind of remnant
+    #  each of sn_events, and SN_total - rate of those supernovae over each bin, per Myr
+    def convolve(self, sfh):
+        sfh = np.asarray(sfh, dtype=float)
+        n = sfh.shape[-1]
+        if n > len(self):
+            raise ValueError('star formation history is ' + str(n) + ' bins long but the burst response only covers ' + str(len(self)))
+        formed = sfh * self.dt
+        size = 1 << (2 * n - 1).bit_length()
+        F = np.fft.rfft(formed, size)[...,None]
+        stages = np.fft.irfft(F * np.fft.rfft(self.stages[:n], size, axis=0), size, axis=-2)[...,:n,:]
+        events = np.fft.irfft(F * np.fft.rfft(self.events[:n], size, axis=0), size, axis=-2)[...,:n,:] / self.dt
+        stages = np.maximum(stages, 0)      #clears rounding errors from the FFTs
+        events = np.maximum(events, 0)
+        out = {'t': np.arange(n) * self.dt, 'stages': stages}
+        for name, (lo, hi) in remnant_census.items():
+            out[name] = stages[...,lo:hi].sum(axis=-1)
+        for i, name in enumerate(starpasta.sn_events):
+            out[name] = events[...,i]
+        out['SN_total'] = events.sum(axis=-1)
+        return out
+
+    def save(self, filename):
+        np.savez_compressed(filename, dt=self.dt, stages=self.stages, events=self.events, Z=np.nan if self.Z is None else self.Z,
+                            failed=self.failed, sn_events=starpasta.sn_events)
+        return filename
+
+def burst_load(filename):
+    with np.load(filename) as f:
+        Z = float(f['Z'])
+        return Burst(float(f['dt']), f['stages'], f['events'], None if np.isnan(Z) else Z, float(f['failed']))
+
+#Number of stars per Msun formed in each of the given log mass bins, for the IMF between mmin and mmax
+def imf_weights(imf, edges, mmin, mmax, points=4097):
+    logm = np.linspace(np.log10(mmin), np.log10(mmax), points)
+    pdf = imf_dlogm(imf, 10**logm)
+    mass = np.sum((pdf[1:] * 10**logm[1:] + pdf[:-1] * 10**logm[:-1]) / 2 * np.diff(logm))
+    cum = np.concatenate([[0], np.cumsum((pdf[1:] + pdf[:-1]) / 2 * np.diff(logm))])
+    return np.diff(np.interp(np.log10(edges), logm, cum)) / mass
+
+#Stage at each age, and supernovae, of one star
+def burst_star(job):
+    M, Z, ages, options = job
+    model = get_model(Z, options)
+    try:
+        data = model.sim_run(M)
+    except Exception:
+        return None, []
+    return Track(data).at(ages, 'stage'), list(model.events)
+
+#Builds the response to a burst at metallicity Z over bins of dt Myr, from points tracks spaced evenly in log mass between mmin and mmax
+#Each track stands for all the stars in its log mass bin, so supernova rates are only as smooth in time as the mass grid is fine
+def burst_response(Z, dt, bins, imf='kroupa', mmin=0.08, mmax=150, points=400, processes=None, **options):
+    edges = np.logspace(np.log10(mmin), np.log10(mmax), points + 1)
+    masses = np.sqrt(edges[1:] * edges[:-1])
+    weights = imf_weights(imf, edges, mmin, mmax)
+    ages = np.arange(bins) * dt
+    stages = np.zeros([bins, 16])
+    events = np.zeros([bins, len(starpasta.sn_events)])
+    failed = 0.0
+    jobs = [(float(M), Z, ages, options) for M in masses]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes > 1:
+        with mp.Pool(processes) as pool:
+            results = pool.map(burst_star, jobs)
+    else:
+        results = map(burst_star, jobs)
+    for w, (stage, star_events) in zip(weights, results):
+        if stage is None:
+            failed += w
+            continue
+        stages[np.arange(bins), stage.astype(int)] += w
+        for t, event, remnant in star_events:
+            k = int(t // dt)
+            if k < bins:
+                events[k, starpasta.sn_events.index(event)] += w
+    return Burst(dt, stages, events, Z, failed)
+
+def main():
+    parser = argparse.ArgumentParser(description='Populations with any star formation history, from the response to a single burst')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='evolve a grid of stars and save the response to a burst of star formation')
+    build.add_argument('--Z', type=float, required=True, help='metallicity')
+    build.add_argument('--dt', type=float, required=True, help='bin width in Myr')
+    build.add_argument('--bins', type=int, required=True, help='number of bins; the longest star formation history that can be used')
+    build.add_argument('--imf', default='kroupa', choices=['salpeter', 'kroupa', 'chabrier'], help='initial mass function')
+    build.add_argument('--mmin', type=float, default=0.08, help='lowest initial mass')
+    build.add_argument('--mmax', type=float, default=150, help='highest initial mass')
+    build.add_argument('--points', type=int, default=400, help='masses evolved, evenly spaced in log mass')
+    build.add_argument('--processes', type=int, default=None, help='worker processes; defaults to the number of cores')
+    build.add_argument('--no-mass-loss', action='store_true', help='turn off mass loss and small envelope adjustment')
+    build.add_argument('--full-LM', action='store_true', help='continue stars below 0.8 solar masses past the main sequence')
+    build.add_argument('--out', default='burst.npz', help='output .npz file')
+    apply = commands.add_parser('apply', help='apply a star formation history to a saved burst response')
+    apply.add_argument('burst', help='.npz file saved by build')
+    apply.add_argument('--sfh', required=True, help='.csv of star formation rates in Msun/Myr, one per bin, oldest first; or a list or lin:/log: spec')
+    apply.add_argument('--out', default='history.csv', help='output .csv file')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'build':
+        options = {'ML_on': not args.no_mass_loss, 'stop_LM': not args.full_LM}
+        burst = burst_response(args.Z, args.dt, args.bins, args.imf, args.mmin, args.mmax, args.points, args.processes, **options)
+        print('Evolved ' + str(args.points) + ' stars in ' + str(round(time.perf_counter() - start, 2)) + ' s')
+        print('Output saved to ' + burst.save(args.out))
+        return
+    burst = burst_load(args.burst)
+    if os.path.exists(args.sfh):
+        sfh = np.loadtxt(args.sfh, delimiter=',', ndmin=1)
+    else:
+        sfh = np.array(grid_values(args.sfh))
+    out = burst.convolve(sfh)
+    fields = ['t'] + ['stage' + str(stage) for stage in range(16)] + list(remnant_census) + starpasta.sn_events + ['SN_total']
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows(np.column_stack([out['t'], out['stages']] + [out[name] for name in fields[17:]]))
+    print('Convolved ' + str(len(sfh)) + ' bins in ' + str(round(time.perf_counter() - start, 3)) + ' s')
+    print('Output saved to ' + args.out)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import starpasta
+
+# Star Pasta Tests
+# Shared models for the tests; the scripts sit in the folder above, as they do for benchmarks/
+
+@pytest.fixture(scope='session')
+def model():
+    return starpasta.StellarModel(0.02, quiet=True)
+
+@pytest.fixture(scope='session')
+def model_low_Z():
+    return starpasta.StellarModel(0.001, quiet=True)
@@ -0,0 +1,42 @@
+import copy
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+import bench_grid
+
+def results(model):
+    return [bench_grid.measure(model, M, 1, 0) for M in [1.0, 15.0]]
+
+def test_compare_same(model):
+    now = results(model)
+    assert bench_grid.compare(now, {'stars': copy.deepcopy(now)}, 0.1) == []
+
+#Changed steps and stages are flagged star by star
+def test_compare_steps_and_stages(model):
+    now = results(model)
+    baseline = {'stars': copy.deepcopy(now)}
+    baseline['stars'][0]['steps'] += 1
+    baseline['stars'][1]['stages'] = '1-2-3'
+    baseline['stars'].append(dict(now[0], M=2.0))     #missing from the results: ignored
+    flagged = bench_grid.compare(now, baseline, 0.1)
+    assert [key for key, note in flagged] == [(1.0, model.Z), (15.0, model.Z)]
+    assert flagged[0][1].startswith('steps') and flagged[1][1].startswith('stages')
+
+#One star twice as slow isn't flagged while the set is within tol, but the set as a whole is once it's past
+def test_compare_total_time(model):
+    now = results(model)
+    for star, seconds in zip(now, [1.0, 9.0]):
+        star['seconds'] = seconds
+    baseline = {'stars': copy.deepcopy(now)}
+    baseline['stars'][0]['seconds'] = 0.5
+    assert bench_grid.compare(now, baseline, 0.1) == []
+    baseline['stars'][1]['seconds'] = 8.0
+    flagged = bench_grid.compare(now, baseline, 0.1)
+    assert len(flagged) == 1 and flagged[0][0] is None
+
+def test_compare_error(model):
+    now = results(model)
+    baseline = {'stars': copy.deepcopy(now)}
+    now[0] = {'M': 1.0, 'Z': model.Z, 'error': 'ValueError: math domain error'}
+    assert bench_grid.compare(now, baseline, 0.1) == [((1.0, model.Z), 'now fails')]
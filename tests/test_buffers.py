@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import starpasta
+from starpasta_query import Track
+
+##############################################################################################################
+
+# DataBuffer
+
+def test_data_buffer():
+    rows = np.random.default_rng(1).random([3000, 15])
+    buffer = starpasta.DataBuffer(15, size=4)
+    for row in rows[:1000]:
+        buffer.append(row)
+    buffer.extend(rows[1000:2500])
+    for row in rows[2500:]:
+        buffer.append(row)
+    assert len(buffer) == 3000
+    assert np.array_equal(buffer.array(), rows)
+
+def test_data_buffer_empty():
+    assert starpasta.DataBuffer(15).array().shape == (0, 15)
+
+##############################################################################################################
+
+# DenseBuffer
+
+def test_dense_ages(model):
+    data = model.sim_run(1.0, ages=[-5, 0, 100, 1e9])
+    assert list(data[:,2]) == [0, 100]
+
+#Rows at the log-spaced ages match the stepped track interpolated there
+def test_dense_per_decade(model):
+    full = Track(model.sim_run(2.0))
+    data = model.sim_run(2.0, per_decade=5)
+    ages = starpasta.log_ages(5)
+    assert data[:,2] == pytest.approx(ages[ages <= full.data[-1,2]], rel=1e-12)
+    assert np.allclose(data[:,3:9], full.at(data[:,2])[:,3:9], rtol=1e-12, atol=0)
+
+#The same number of rows for every stage, spanning each from start to end
+def test_dense_per_stage(model):
+    full = Track(model.sim_run(2.0))
+    data = Track(model.sim_run(2.0, per_stage=20))
+    assert list(data.stages) == list(full.stages)
+    for stage in full.stages:
+        assert np.sum(data.data[:,1] == stage) == 20
+        assert data.stage_span(stage) == pytest.approx(full.stage_span(stage), rel=1e-12)
+
+##############################################################################################################
+
+# ThinBuffer
+
+#Interpolating the kept rows in age within each stage gives back every row to within thin_tol, and sim_run's thin_ratio is rows in per row kept
+def test_thin_tolerance(model, model_low_Z):
+    cols = {name: starpasta.columns.index(name) for name in starpasta.thin_tol}
+    for model in [model, model_low_Z]:
+        for M in np.geomspace(0.6, 60, 12):
+            full = model.sim_run(M)
+            kept = starpasta.thin(full)
+            for stage in np.unique(full[:,1]):
+                rows = full[full[:,1] == stage]
+                knots = kept[kept[:,1] == stage]
+                assert np.array_equal(knots[0], rows[0]) and np.array_equal(knots[-1], rows[-1])
+                for name, tol in starpasta.thin_tol.items():
+                    v = rows[:,cols[name]]
+                    est = np.interp(rows[:,2], knots[:,2], knots[:,cols[name]])
+                    if name in ('L', 'R', 'Teff'):
+                        v, est = np.log10(v[v > 0]), np.log10(est[v > 0])
+                    assert np.all(np.abs(est - v) <= tol * (1 + 1e-9))
+            data = model.sim_run(M, thin=True)
+            assert np.array_equal(data[:,:10], kept[:,:10]) and np.allclose(data, kept, rtol=1e-12)
+            assert model.thin_ratio == len(full) / len(kept)
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+import starpasta_check
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def test_check(tmp_path):
+    reference = str(tmp_path / 'ref.npz')
+    starpasta_check.reference_save(reference, '1,5', '0.02')
+    results = starpasta_check.check(reference, tol=0)
+    assert not any(result['failures'] for result in results.values())
+
+#A deviation is reported in the stage and column it happened in, and only fails past that column's tolerance
+def test_compare_tracks(model):
+    ref = model.sim_run(2.0)
+    result = starpasta_check.compare_tracks(ref, ref.copy())
+    assert result['stages'] == result['new_stages'] == [1, 2, 3, 4, 5, 6, 11]
+    assert all(value == 0 for dev in result['deviation'].values() for value in dev.values())
+    assert all(n == 0 for n in result['unmatched'].values())
+    new = ref.copy()
+    new[new[:,1] == 3, 7] *= 1.001
+    result = starpasta_check.compare_tracks(ref, new)
+    assert result['deviation'][3]['L'] > 0.9e-3 and result['deviation'][3]['R'] == 0 and result['deviation'][2]['L'] == 0
+    assert starpasta_check.failures(result) == ['stage 3 L deviates by %.3g' % result['deviation'][3]['L']]
+    assert starpasta_check.failures(result, col_tol={'L': 2e-3}) == []
+
+def test_compare_remnant(model):
+    ref = model.sim_run(2.0)
+    new = ref.copy()
+    new[new[:,1] == 11, 1] = 12
+    found = starpasta_check.failures(starpasta_check.compare_tracks(ref, new))
+    assert found == ['stages 1-2-3-4-5-6-11 -> 1-2-3-4-5-6-12', 'remnant 11 -> 12']
+
+def test_check_tol_col():
+    run = subprocess.run([sys.executable, 'starpasta_check.py', 'ref.npz', '--tol-col', 'Lum=1e-3'], cwd=root, capture_output=True, text=True)
+    assert run.returncode == 2 and "no column 'Lum'" in run.stderr
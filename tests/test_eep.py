@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import starpasta
+import starpasta_eep
+
+@pytest.fixture(scope='module')
+def grid(model):
+    return starpasta_eep.TrackGrid({(M, 0.02): model.sim_run(M) for M in [3, 4]})
+
+def test_track(grid):
+    data = grid.track(3.5, 0.02)
+    assert (np.diff(data[:,2]) >= 0).all()
+    assert np.isfinite(data).all()
+    assert np.array_equal(data[:,10:], starpasta.derive_columns(data.copy())[:,10:])
+    with pytest.raises(ValueError):
+        grid.track(5.0, 0.02)
+
+#At the ends of the blend, each stage starts and ends where it does in that track
+def test_blend_ends(grid):
+    a, b = grid.eeps[(3, 0.02)], grid.eeps[(4, 0.02)]
+    for w, ref in [(0, a), (1, b)]:
+        for (stage, rows, x), (ref_stage, ref_rows, ref_x) in zip(starpasta_eep.eep_blend(a, b, w), ref):
+            assert stage == ref_stage
+            assert rows[[0, -1], 2] == pytest.approx(ref_rows[[0, -1], 2], rel=1e-12)
+
+#The interpolated track ends each stage close to where an evolved track of the same mass does
+def test_against_sim_run(model, grid):
+    data = grid.track(3.5, 0.02)
+    ref = model.sim_run(3.5)
+    for stage in range(1, 7):
+        assert data[data[:,1] == stage][-1,2] == pytest.approx(ref[ref[:,1] == stage][-1,2], rel=0.01)
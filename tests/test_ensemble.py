@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import starpasta
+import starpasta_ensemble
+from starpasta_imf import sample_masses
+
+#The same timesteps and stages as sim_run for every star, and the same values up to rounding
+@pytest.mark.parametrize('Z', [0.02, 0.001])
+def test_tracks(Z):
+    model = starpasta.StellarModel(Z, quiet=True)
+    stars = sample_masses(np.random.default_rng(3), 60, 'kroupa', 0.08, 150)
+    tracks = starpasta_ensemble.ensemble_run(model, stars)
+    for M, track in zip(stars.tolist(), tracks):
+        ref = model.sim_run(M)
+        assert track.shape == ref.shape, M
+        assert np.array_equal(track[:,:2], ref[:,:2]), M
+        assert np.allclose(track, ref, rtol=1e-9, atol=0), M
+
+#Stars of every kind, including ones that pass through the stages left to sim_step, and a star stopped at max_age
+def test_stages(model):
+    masses = [0.5, 1.0, 3.0, 10.0, 40.0]
+    tracks = starpasta_ensemble.ensemble_run(model, masses, max_age=12000)
+    for M, track in zip(masses, tracks):
+        ref = model.sim_run(M, max_age=12000)
+        assert np.array_equal(track[:,1], ref[:,1]) and track[-1,2] == ref[-1,2]
+
+#A RunReport left on the model by an earlier run isn't added to
+def test_report_cleared():
+    model = starpasta.StellarModel(0.02, quiet=True)
+    data, report = model.sim_run(2.0, report=True)
+    steps = report.as_dict()
+    starpasta_ensemble.ensemble_run(model, [2.0])
+    assert report.as_dict() == steps
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+import starpasta
+import starpasta_grid
+
+def test_grid_values():
+    assert starpasta_grid.grid_values('0.123456789,2') == [0.123456789, 2.0]
+    assert starpasta_grid.grid_values('lin:1:2:3') == [1.0, 1.5, 2.0]
+    assert starpasta_grid.grid_values('log:0.08:300:3') == pytest.approx([0.08, np.sqrt(0.08 * 300), 300], rel=1e-15)
+    assert starpasta_grid.grid_values('log:0.08:300:3')[::2] == [0.08, 300.0]
+
+#Stars are evolved at their exact masses, and only the file names are rounded
+def test_grid_run(tmp_path):
+    rows = starpasta_grid.grid_run('0.9,1.23456789', '0.02', str(tmp_path), processes=1)
+    assert [row['file'] for row in rows] == ['Z0.02_M0.9.csv', 'Z0.02_M1.23457.csv']
+    tracks = starpasta_grid.grid_load(str(tmp_path))
+    assert sorted(tracks) == [(0.9, 0.02), (1.23456789, 0.02)]
+    ref = starpasta.StellarModel(0.02, quiet=True).sim_run(1.23456789)
+    assert np.allclose(tracks[(1.23456789, 0.02)], ref, rtol=1e-15, atol=0)
+
+#The workers give the same results as a single process, and a star that fails is recorded in the manifest rather than stopping the grid
+def test_processes(tmp_path):
+    one = starpasta_grid.grid_run('-1,2,5', '0.001,0.02', str(tmp_path / 'one'), processes=1)
+    two = starpasta_grid.grid_run('-1,2,5', '0.001,0.02', str(tmp_path / 'two'), processes=2)
+    fields = ['M', 'Z', 'file', 'steps', 'rejected', 'stage', 'mass', 'age', 'error']
+    assert [[row[name] for name in fields] for row in one] == [[row[name] for name in fields] for row in two]
+    assert [bool(row['error']) for row in one] == [True, False, False] * 2
+    assert sorted(starpasta_grid.grid_load(str(tmp_path / 'one'))) == [(2.0, 0.001), (2.0, 0.02), (5.0, 0.001), (5.0, 0.02)]
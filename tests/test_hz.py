@@ -0,0 +1,48 @@
+import numpy as np
+
+import starpasta_hz
+
+def test_hz(model):
+    hz = starpasta_hz.hz_occupancy(model.sim_run(1.0), np.logspace(-1, 1, 50))
+    assert hz['conservative']['total'].shape == (3, 50)
+    assert hz['conservative']['total'][1].max() > 1000
+
+#Times in the HZ for each orbit, one row at a time: the star holds each row's state until the next, and an engulfed orbit counts no longer
+def hz_times(data, a, definition, mass):
+    L, Teff = starpasta_hz.track_L_Teff(data)
+    lo, hi = starpasta_hz.hz_bounds(L, Teff, definition, mass)
+    reach = 0.0
+    total = run = longest = 0.0
+    for i in range(len(data) - 1):
+        reach = max(reach, data[i,8] / starpasta_hz.au)
+        if lo[i] <= a <= hi[i] and a > reach:
+            total += data[i + 1,2] - data[i,2]
+            run += data[i + 1,2] - data[i,2]
+            longest = max(longest, run)
+        else:
+            run = 0.0
+    return total, longest
+
+#The vectorized times match the row by row ones on orbits in any order, including ones the star grows to engulf
+def test_hz_occupancy(model):
+    data = model.sim_run(1.0)
+    a = np.random.default_rng(1).permutation(np.concatenate([np.logspace(-1.5, 1, 40), [0.6, 0.95, 1.0, 1.05]]))
+    hz = starpasta_hz.hz_occupancy(data, a)
+    for definition in starpasta_hz.hz_definitions:
+        for k, mass in enumerate(starpasta_hz.planet_masses):
+            for j in range(len(a)):
+                total, longest = hz_times(data, a[j], definition, mass)
+                assert np.isclose(hz[definition]['total'][k,j], total, rtol=1e-9, atol=1e-9)
+                assert np.isclose(hz[definition]['continuous'][k,j], longest, rtol=1e-9, atol=1e-9)
+
+def test_engulfment(model):
+    data = model.sim_run(1.0)
+    Rmax = data[:,8].max() / starpasta_hz.au
+    a = np.array([0.001, Rmax / 2, Rmax * 0.999, Rmax * 1.001])
+    engulfed = starpasta_hz.engulfment(data, a)
+    for j in range(3):
+        first = np.argmax(data[:,8] / starpasta_hz.au >= a[j])
+        assert engulfed[j] == data[first,2]
+    assert engulfed[0] == data[0,2] and engulfed[1] < engulfed[2] and np.isnan(engulfed[3])
+    hz = starpasta_hz.hz_occupancy(data, a)
+    assert np.array_equal(hz['engulfed'], engulfed, equal_nan=True)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+import starpasta_imf
+
+def test_imf():
+    masses = starpasta_imf.sample_masses(np.random.default_rng(1), 1000, 'kroupa', 0.08, 150)
+    assert masses.min() >= 0.08 and masses.max() <= 150
+
+#The pieces of each IMF join up, and above 1 Msun each doubling of mass holds 2^(slope - 1) times fewer stars
+@pytest.mark.parametrize('imf, slope', [('salpeter', 2.35), ('kroupa', 2.3), ('chabrier', 2.3)])
+def test_imf_slope(imf, slope):
+    for m in [0.08, 0.5, 1.0]:
+        below, above = starpasta_imf.imf_dlogm(imf, [m * (1 - 1e-9), m])
+        assert below == pytest.approx(above, rel=0.01)
+    masses = starpasta_imf.sample_masses(np.random.default_rng(1), 400000, imf, 0.08, 150)
+    counts = np.histogram(masses, [1, 2, 4])[0]
+    assert counts[0] / counts[1] == pytest.approx(2**(slope - 1), rel=0.03)
+
+def test_imf_unknown():
+    with pytest.raises(ValueError, match='unknown IMF'):
+        starpasta_imf.imf_dlogm('miller-scalo', 1.0)
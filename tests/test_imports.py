@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+modules = ['starpasta', 'starpasta_check', 'starpasta_eep', 'starpasta_ensemble', 'starpasta_grid', 'starpasta_hz', 'starpasta_imf',
+           'starpasta_iso', 'starpasta_pop', 'starpasta_query', 'starpasta_sfh']
+
+#Each in a fresh interpreter, so an import cycle can't be hidden by a module already loaded by another test
+@pytest.mark.parametrize('name', modules)
+def test_import(name):
+    subprocess.run([sys.executable, '-c', 'import ' + name], cwd=root, check=True)
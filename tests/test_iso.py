@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+import starpasta
+import starpasta_iso
+from starpasta_query import Track
+
+def test_shape(model):
+    iso = starpasta_iso.isochrone(model, [100, 1000], [0.5, 1, 2])
+    for name in starpasta_iso.iso_columns:
+        assert iso[name].shape == (2, 3)
+    assert (iso['age'][:,0] == [100, 1000]).all() and (iso['M'][0] == [0.5, 1, 2]).all()
+
+#Without mass loss every stage up to the TPAGB is taken straight from the stage functions; those states agree with the tracks,
+#up to the linear interpolation between the track's timesteps
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_direct_against_tracks():
+    model = starpasta.StellarModel(0.02, quiet=True, ML_on=False)
+    for M in [3.0, 5.0]:
+        data = model.sim_run(M)
+        t = data[:,2]
+        stage = data[:,1]
+        ages = np.linspace(t[stage == 1][-1] * 0.99, t[(stage >= 2) & (stage <= 5)][-1], 100)
+        iso = starpasta_iso.isochrone(model, ages, [M])
+        rows = Track(data).at(ages)
+        direct = iso['direct'][:,0]
+        assert set(iso['stage'][direct,0]) == {1, 2, 3, 4, 5}
+        assert (iso['stage'][:,0] == rows[:,1]).all()
+        assert iso['L'][direct,0] == pytest.approx(rows[direct,7], rel=0.05)
+        assert iso['R'][direct,0] == pytest.approx(rows[direct,8], rel=0.05)
+
+#Stars whose state depends on their history are read off their tracks
+def test_from_tracks(model):
+    tracks = {}
+    iso = starpasta_iso.isochrone(model, [10000], [5.0], tracks)
+    assert not iso['direct'][0,0] and 5.0 in tracks
+    rows = Track(tracks[5.0]).at([10000])
+    assert iso['stage'][0,0] == rows[0,1] and iso['L'][0,0] == rows[0,7]
@@ -0,0 +1,259 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import starpasta
+from starpasta_query import Track
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+##############################################################################################################
+
+# Model
+
+#Importing runs nothing and asks for nothing
+def test_import_quietly():
+    run = subprocess.run([sys.executable, '-c', 'import starpasta'], cwd=root, stdin=subprocess.DEVNULL, capture_output=True, text=True, check=True)
+    assert run.stdout == ''
+
+def test_sim_run(model):
+    data = model.sim_run(1.0)
+    assert data.shape[1] == len(starpasta.columns)
+    assert data[0,1] == 1 and data[-1,1] == 11
+    assert (np.diff(data[:,2]) >= 0).all()     #the first row of a remnant has the age of the last before it
+    assert model.steps_accepted == len(data)
+
+#Models of different metallicities don't share any state
+def test_side_by_side():
+    alone = starpasta.StellarModel(0.001, quiet=True).sim_run(3.0)
+    a = starpasta.StellarModel(0.02, quiet=True)
+    b = starpasta.StellarModel(0.001, quiet=True)
+    a.sim_run(3.0)
+    mixed = b.sim_run(3.0)
+    a.sim_run(5.0)
+    assert np.array_equal(mixed, alone)
+    assert np.array_equal(b.sim_run(3.0), alone)
+    assert a.zeta != b.zeta
+
+##############################################################################################################
+
+# Per-mass cache
+
+def test_cache_mass():
+    model = starpasta.StellarModel(0.02, quiet=True)
+    fresh = starpasta.StellarModel(0.02, quiet=True)
+    model.cache_mass(2.0)
+    assert model.f_tMS(2.0) == fresh.f_tMS(2.0) and 'f_tMS' in model.cache
+    assert model.f_tMS(3.0) == fresh.f_tMS(3.0)     #other masses are worked out, and not cached
+    assert model.cache['f_tMS'] == fresh.f_tMS(2.0)
+    model.cache_mass(3.0)
+    assert model.cache == {}
+    assert model.f_tMS(3.0) == fresh.f_tMS(3.0) and model.cache['f_tMS'] == fresh.f_tMS(3.0)
+    model.cache_mass(3.0)   #the same mass keeps the cache
+    assert 'f_tMS' in model.cache
+
+#Calls with precomputed arguments, or with arrays, go around the cache
+def test_cache_bypass():
+    model = starpasta.StellarModel(0.02, quiet=True)
+    model.cache_mass(2.0)
+    model.cache['f_tMS'] = -1.0
+    assert model.f_tMS(2.0) == -1.0
+    assert model.f_tMS(2.0, model.f_tBGB(2.0)) > 0
+    assert (model.f_tBGB(np.array([2.0, 2.0])) == model.f_tBGB(3.0 - 1.0)).all()
+
+#A cache left from one star never leaks into the next
+def test_cache_between_runs():
+    model = starpasta.StellarModel(0.02, quiet=True)
+    runs = [model.sim_run(M) for M in [1.0, 2.0, 1.0]]
+    assert np.array_equal(runs[0], runs[2])
+    assert np.array_equal(runs[1], starpasta.StellarModel(0.02, quiet=True).sim_run(2.0))
+
+##############################################################################################################
+
+# Core helium burning
+
+def cheb_midpoint(model, M):
+    model.cache_mass(M)
+    tHeI = model.f_tHeI(M)
+    return tHeI + 0.5 * model.f_tHe(M, model.f_tBGB(M), model.f_McHeI(M))
+
+#Below MHeF the secant iteration finds the fixed point McCHeB = Mc(tau(McCHeB)) in a few steps
+def test_McCHeB_converges():
+    model = starpasta.StellarModel(0.02, quiet=True)
+    M = 1.0
+    assert M < model.MHeF
+    t = cheb_midpoint(model, M)
+    Mc, mu, tau = model.f_McCHeB(M, t, model.f_McHeI(M), 1e-12)
+    assert model.cheb_converged and model.cheb_loops <= 8
+    again = model.f_McCHeB(M, t, Mc, 1e-12)[0]     #started at the solution, it stays there
+    assert again == pytest.approx(Mc, rel=1e-12) and model.cheb_loops == 1
+    assert (1 - tau) * model.f_McHeI(M) + tau * model.f_McBAGB(M) == Mc
+
+#Without convergence the closest estimate is used and a warning logged, rather than an error
+def test_McCHeB_soft_failure(capsys):
+    model = starpasta.StellarModel(0.02)
+    M = 1.0
+    t = cheb_midpoint(model, M)
+    solved = model.f_McCHeB(M, t, model.f_McHeI(M), 1e-12)[0]
+    model.cheb_max_loops = 2
+    Mc = model.f_McCHeB(M, t, model.f_McHeI(M), 1e-14)[0]
+    assert not model.cheb_converged and model.cheb_loops == 2
+    assert 'did not converge' in capsys.readouterr().out
+    assert Mc == pytest.approx(solved, rel=1e-6)
+    model.quiet = True
+    assert model.sim_run(M)[-1,1] == 11
+
+##############################################################################################################
+
+# Step control
+
+def test_step_predict(model):
+    m0, mt, Mc, McCO, R = 2.0, 2.0, 0.3, 0.0, 10.0
+    predict = lambda dt, R1, stage=3, stagei=3: model.step_predict(dt, m0, mt, mt, Mc, Mc, McCO, McCO, R1, R, stage, stagei)
+    assert predict(1.0, R * 0.95) == pytest.approx(0.8 * 0.1 / 0.05)   #aims at a safe fraction of the 10% radius limit
+    assert predict(1.0, R) == 5.0       #nothing changing: at most 5 times longer
+    assert predict(1.0, R * 0.5) == 0.2     #and at least 5 times shorter
+    assert predict(1.0, R * 0.95, stage=4) is None and predict(0.0, R * 0.95) is None
+
+#The same stages and nearly the same track, with far fewer retries
+def test_step_control():
+    fixed = starpasta.StellarModel(0.02, quiet=True, step_control=False)
+    control = starpasta.StellarModel(0.02, quiet=True)
+    rejected = [0, 0]
+    for M in [2.0, 15.0, 40.0]:
+        old = Track(fixed.sim_run(M))
+        new = Track(control.sim_run(M))
+        rejected[0] += fixed.steps_rejected
+        rejected[1] += control.steps_rejected
+        assert list(new.stages) == list(old.stages)
+        for stage in old.stages:
+            assert new.stage_span(stage)[1] == pytest.approx(old.stage_span(stage)[1], rel=0.01)
+    assert rejected[1] * 5 < rejected[0]
+
+##############################################################################################################
+
+# Remnant grid
+
+#The filled-in remnant track passes through the stepped one: same start and end, 10 ages per decade in between
+def test_remnant_grid():
+    stepped = starpasta.StellarModel(0.02, quiet=True)
+    filled = starpasta.StellarModel(0.02, quiet=True, remnant_grid=10)
+    for M in [1.0, 15.0, 40.0]:
+        old = stepped.sim_run(M)
+        new = filled.sim_run(M)
+        old, new = old[old[:,1] > 9], new[new[:,1] > 9]
+        assert np.all(new[:,1] == old[0,1])
+        np.testing.assert_array_equal(new[0,1:], old[0,1:])
+        np.testing.assert_allclose(new[-1,1:], old[-1,1:], rtol=1e-12)
+        np.testing.assert_allclose(np.diff(np.log10(new[1:,2] - new[0,2])), 0.1, atol=1e-6)
+        assert np.interp(old[:,2], new[:,2], new[:,7]) == pytest.approx(old[:,7], rel=0.05)
+    track = filled.sim_run(1.0, max_age=20000)
+    assert track[-1,2] == 20000 and track[-1,1] == 11
+
+##############################################################################################################
+
+# Run report
+
+#The counts add up to the model's own step counts and the rows returned, and land in the stages they happened in
+def test_run_report():
+    model = starpasta.StellarModel(0.02, quiet=True, step_control=False)
+    data, report = model.sim_run(2.0, report=True)
+    assert report is model.report
+    assert report.total('steps') == model.steps_accepted and report.total('rejected') == model.steps_rejected > 0
+    assert report.rows == len(data)
+    assert sorted(report.stages) == sorted(np.unique(data[:,1]))
+    assert report.stages[4]['cheb_solves'] > 0 and report.total('cheb_solves') == report.stages[4]['cheb_solves']
+    assert report.total('cheb_loops') >= report.total('cheb_solves') and report.total('cheb_unconverged') == 0
+    data, report = model.sim_run(2.0, thin=True, report=True)
+    assert report.total('steps') == model.steps_accepted and report.rows == len(data) < model.steps_accepted
+    assert model.sim_run(2.0) is not None and model.report is None
+
+def test_run_report_save(tmp_path):
+    model = starpasta.StellarModel(0.02, quiet=True)
+    report = model.sim_run(15.0, report=True)[1]
+    filename = report.save(str(tmp_path / 'report.json'))
+    with open(filename) as f:
+        saved = json.load(f)
+    assert saved == report.as_dict()
+    assert set(saved['total']) == set(starpasta.RunReport.fields)
+    assert sum(counts['steps'] for counts in saved['stages'].values()) == saved['total']['steps']
+
+##############################################################################################################
+
+# Generator
+
+#sim_iter yields the rows sim_run returns, and can be left at any point without harm to the model
+def test_sim_iter(model):
+    data = model.sim_run(2.0)
+    rows = np.array(list(model.sim_iter(2.0)))
+    assert np.array_equal(rows[:,:10], data[:,:10]) and np.allclose(rows, data, rtol=1e-12)
+    for n, row in enumerate(model.sim_iter(2.0)):
+        if row[1] == 4:
+            break
+    assert np.array_equal(row, rows[n]) and model.steps_accepted == n + 1
+    assert np.array_equal(model.sim_run(2.0), data)
+
+def test_sim_iter_remnant_grid():
+    model = starpasta.StellarModel(0.02, quiet=True, remnant_grid=10)
+    rows = list(model.sim_iter(1.0))
+    assert len(rows) == len(model.sim_run(1.0))
+    assert np.array_equal(np.array(rows)[:,:10], model.sim_run(1.0)[:,:10])
+
+##############################################################################################################
+
+# Stop conditions
+
+#A run ended early is the full run up to the row it stopped on
+def test_max_age(model):
+    full = model.sim_run(1.0)
+    data = model.sim_run(1.0, max_age=5000)
+    assert data[-1,2] == 5000 and np.array_equal(data[:-1], full[:len(data) - 1])
+    assert full[len(data) - 2,2] < 5000 < full[len(data) - 1,2]
+
+def test_stop_stage(model):
+    full = model.sim_run(15.0)
+    data = model.sim_run(15.0, stop_stage=10)
+    assert data[-1,1] >= 10 and np.all(data[:-1,1] < 10)
+    assert np.array_equal(data, full[:len(data)])
+
+def test_stop_when(model):
+    full = model.sim_run(1.0)
+    data = model.sim_run(1.0, stop_when=starpasta.stop_above('R', 100))
+    assert data[-1,8] > 100 and np.all(data[:-1,8] <= 100)
+    assert np.array_equal(data, full[:len(data)])
+    data = model.sim_run(1.0, stop_when=[starpasta.stop_above('R', 1000), starpasta.stop_below('mt', 0.9)])
+    assert data[-1,3] < 0.9 and np.all(data[:-1,3] >= 0.9) and np.all(data[:,8] <= 1000)
+    assert np.array_equal(data, full[:len(data)])
+
+##############################################################################################################
+
+# Derived columns
+
+#Filling in Teff and the HZ after the run gives what data_add gives row by row, and nothing for stars that are gone
+def test_derive_columns():
+    model = starpasta.StellarModel(0.0001, quiet=True)
+    for M in [1.0, 150.0]:
+        data = model.sim_run(M)
+        for row in data:
+            if row[1] in (0, 15):
+                assert np.all(row[10:] == 0)
+            else:
+                assert row[10:] == pytest.approx(starpasta.data_add(row[7], row[8]), rel=1e-12)
+        assert data[-1,1] == (11 if M == 1.0 else 15)
+
+#Without derived, the columns stay at 0 and the rest of the track is unchanged; derive_columns fills them in later, for any planet mass
+def test_derived_off(model):
+    data = model.sim_run(2.0)
+    bare = starpasta.StellarModel(0.02, quiet=True, derived=False)
+    rows = bare.sim_run(2.0)
+    assert np.all(rows[:,10:] == 0) and np.array_equal(rows[:,:10], data[:,:10])
+    assert np.all(bare.sim_run(2.0, thin=True)[:,10:] == 0)
+    starpasta.derive_columns(rows)
+    assert np.allclose(rows, data, rtol=1e-12, atol=0)
+    heavy = starpasta.derive_columns(rows.copy(), planet_mass=5)
+    changed = np.any(heavy != rows, axis=0)
+    assert list(np.nonzero(changed)[0]) == [12]
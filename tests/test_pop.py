@@ -0,0 +1,25 @@
+import numpy as np
+
+import starpasta_pop
+
+def test_counts():
+    pop = starpasta_pop.population(200, '0.02', '100,10000', seed=1, processes=1, chunk=100)
+    assert pop.stars.sum() == 200 and pop.initial_mf.sum() == 200
+    assert (pop.stage_counts.sum(axis=2) == 200 - pop.failed[:,None]).all()
+    #every remnant is in the mass function of its type
+    for k, (lo, hi) in enumerate(starpasta_pop.remnant_stages):
+        assert (pop.remnant_mf[:,:,k].sum(axis=2) == pop.stage_counts[:,:,lo:hi].sum(axis=2)).all()
+
+#The chunks have their own seeds, so the result doesn't depend on the number of processes
+def test_processes():
+    one = starpasta_pop.population(60, '0.02', '1000', seed=2, processes=1, chunk=20)
+    two = starpasta_pop.population(60, '0.02', '1000', seed=2, processes=2, chunk=20)
+    for name in starpasta_pop.Population.counts:
+        assert np.array_equal(getattr(one, name), getattr(two, name))
+
+#Stars that leave no remnant (pair-instability supernovae) are binned by their initial mass
+def test_no_remnant():
+    pop = starpasta_pop.population(50, '0.0001', '100', seed=1, processes=1, chunk=50, mmin=100, mmax=150)
+    none = pop.remnant_mf[0, 0, starpasta_pop.remnant_types.index('none')]
+    assert none.sum() == pop.stage_counts[0, 0, 15] > 0
+    assert pop.mass_bins[np.nonzero(none)[0]].min() >= pop.mass_bins[np.searchsorted(pop.mass_bins, 100) - 1]
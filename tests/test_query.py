@@ -0,0 +1,34 @@
+import numpy as np
+
+import starpasta
+import starpasta_query
+
+def test_at_steps(model):
+    data = model.sim_run(1.0)
+    track = starpasta_query.Track(data)
+    steps = np.nonzero(np.diff(data[:,2]) > 0)[0]     #the last of any rows sharing an age is the one looked up
+    assert np.allclose(track.at(data[steps,2], 'L'), data[steps,7], rtol=1e-12)
+    assert np.array_equal(track.at(data[steps,2])[:,1], data[steps,1])
+
+#Halfway between two timesteps, with the stage of the earlier one; ages past the ends are clamped
+def test_interpolation(model):
+    data = model.sim_run(2.0)
+    track = starpasta_query.Track(data)
+    k = np.nonzero(np.diff(data[:,1]))[0][0]    #last row of the main sequence
+    row = track.at([(data[k,2] + data[k+1,2]) / 2])[0]
+    assert row[1] == data[k,1]
+    assert np.allclose(row[2:], (data[k,2:] + data[k+1,2:]) / 2, rtol=1e-12)
+    assert np.array_equal(track.at([-1, 1e12]), data[[0, -1]])
+
+def test_stage(model):
+    data = model.sim_run(2.0)
+    track = starpasta_query.Track(data)
+    t0, t1 = track.stage_span(4)
+    L = track.at([t0 / 2, (t0 + t1) / 2, t1 * 2], 'L', stage=4)
+    assert np.isnan(L[[0, 2]]).all() and np.isfinite(L[1])
+    assert np.isnan(track.at([100], stage=14)).all() and track.stage_span(14) is None
+
+def test_query(model):
+    data = model.sim_run(1.0)
+    assert starpasta_query.query([data, data], [1, 10]).shape == (2, 2, len(starpasta.columns))
+    assert starpasta_query.query([data], [1, 10], 'L').shape == (1, 2)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import starpasta
+import starpasta_sfh
+
+@pytest.fixture(scope='module')
+def burst():
+    return starpasta_sfh.burst_response(0.02, 100, 50, points=20, processes=1)
+
+def test_sfh(burst):
+    result = burst.convolve(np.ones(50))
+    assert result['stages'].shape == (50, 16)
+
+#A single burst of 1 Msun gives back the burst response, and a constant rate its running sum
+def test_sfh_burst(burst):
+    single = np.zeros(50)
+    single[0] = 1 / burst.dt
+    result = burst.convolve(single)
+    assert np.allclose(result['stages'], burst.stages, rtol=0, atol=1e-12)
+    assert np.allclose(result['SN_total'], burst.events.sum(axis=1) / burst.dt, rtol=0, atol=1e-12)
+    constant = burst.convolve(np.full(50, 1 / burst.dt))
+    assert np.allclose(constant['stages'], np.cumsum(burst.stages, axis=0), rtol=0, atol=1e-9)
+    assert np.allclose(constant['WD'], np.cumsum(burst.stages[:,10:13].sum(axis=1)), rtol=0, atol=1e-9)
+
+#Several histories at once give the same as each on its own, and every star formed is counted once
+def test_sfh_histories(burst):
+    sfh = np.random.default_rng(1).random([3, 40])
+    result = burst.convolve(sfh)
+    for i in range(3):
+        assert np.allclose(result['stages'][i], burst.convolve(sfh[i])['stages'], rtol=0, atol=1e-9)
+    stars = burst.stages[0].sum()
+    assert np.allclose(result['stages'].sum(axis=-1), np.cumsum(sfh * burst.dt, axis=-1) * stars, rtol=1e-9)
+    with pytest.raises(ValueError):
+        burst.convolve(np.ones(51))
+
+def test_burst_save(burst, tmp_path):
+    loaded = starpasta_sfh.burst_load(burst.save(str(tmp_path / 'burst.npz')))
+    assert loaded.dt == burst.dt and loaded.Z == burst.Z and loaded.failed == burst.failed
+    assert np.array_equal(loaded.stages, burst.stages) and np.array_equal(loaded.events, burst.events)
+    assert len(starpasta.sn_events) == loaded.events.shape[1]
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+import starpasta
+
+def stale(root, name='0123456789abcdef', size=100):
+    folder = root / name
+    folder.mkdir()
+    (folder / 'x.npz').write_bytes(b'0' * size)
+    return folder
+
+def test_hit(tmp_path):
+    cache = starpasta.TrackCache(str(tmp_path))
+    model = starpasta.StellarModel(0.02, quiet=True, track_cache=cache)
+    data = model.sim_run(2.0)
+    events = list(model.events)
+    assert cache.misses == 1
+    assert np.array_equal(model.sim_run(2.0), data) and cache.hits == 1
+    assert model.events == events
+    model.sim_run(2.0, max_age=100)     #other arguments are another entry
+    assert cache.misses == 2
+
+#Other versions are left in place until the cache is trimmed or cleared
+def test_versions(tmp_path):
+    old = stale(tmp_path)
+    cache = starpasta.TrackCache(str(tmp_path))
+    assert old.exists()
+    starpasta.StellarModel(0.02, quiet=True, track_cache=cache).sim_run(2.0)
+    assert cache.size() > 100
+    cache.clear()
+    assert cache.size() == 0 and not old.exists()
+
+#Entries of other versions go first, even when they were used more recently than the current ones
+def test_evict_versions_first(tmp_path):
+    cache = starpasta.TrackCache(str(tmp_path))
+    starpasta.StellarModel(0.02, quiet=True, track_cache=cache).sim_run(2.0)
+    current = cache.size()
+    old = stale(tmp_path, size=1000)
+    entry = os.path.join(cache.folder, os.listdir(cache.folder)[0])
+    os.utime(entry, (1, 1))
+    cache.max_bytes = current + 500
+    cache.evict()
+    assert not old.exists() and cache.size() == current
+
+#A result removed by another process between being read and being marked as used is still a hit
+def test_get_race(tmp_path, monkeypatch):
+    cache = starpasta.TrackCache(str(tmp_path))
+    cache.put('key', rows=np.ones(3))
+    def utime(path):
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(os, 'utime', utime)
+    assert np.array_equal(cache.get('key')['rows'], np.ones(3))
+    assert cache.hits == 1 and cache.misses == 0
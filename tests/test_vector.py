@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+# The _v array formulae against the scalar ones they stand in for
+
+masses = np.logspace(np.log10(0.1), np.log10(100), 41)
+
+#Scalar and array formulae at each mass; up to rounding, since numpy's array powers can differ from python's in the last place
+@pytest.mark.parametrize('name', ['f_thook', 'f_tMS', 'f_RTMS', 'f_LHeI'])
+def test_vector_formulae(model, name):
+    scalar = [getattr(model, name)(M) for M in masses]
+    assert getattr(model, name + '_v')(masses) == pytest.approx(scalar, rel=1e-12)
+
+def test_vector_giant_radii(model):
+    L = np.full(len(masses), 100.0)
+    assert model.f_RGB_v(masses, L) == pytest.approx([model.f_RGB(M, 100.0) for M in masses], rel=1e-12)
+    assert model.f_RAGB_v(masses, L) == pytest.approx([model.f_RAGB(M, 100.0) for M in masses], rel=1e-12)
+
+def test_vector_remnants(model):
+    WD = np.linspace(0.2, 1.4, 25)
+    assert model.f_RWD_v(WD) == pytest.approx([model.f_RWD(M) for M in WD], rel=1e-12)
+    McBAGB = np.linspace(0.5, 10, 50)
+    assert model.f_McSN_v(McBAGB) == pytest.approx([model.f_McSN(Mc) for Mc in McBAGB], rel=1e-15)
+
+def test_vector_main_seq(model):
+    for M in [0.3, 1.0, 5.0, 40.0]:
+        model.cache_mass(M)
+        t = np.linspace(0, 0.99, 20) * model.f_tMS(M)
+        L, R = model.main_seq_v(np.full(len(t), M), t)
+        scalar = np.array([model.main_seq(M, age) for age in t])
+        assert L == pytest.approx(scalar[:,0], rel=1e-12)
+        assert R == pytest.approx(scalar[:,1], rel=1e-12)
+    model.cache_mass(None)
+
+#Mass loss over the rows of real tracks, which cover every stage and wind
+def test_vector_mass_loss(model):
+    rows = np.concatenate([model.sim_run(M)[::5] for M in [1.0, 5.0, 30.0, 100.0]])
+    mt, Mc, McCO, L, R, stage = rows[:,3], rows[:,4], rows[:,5], rows[:,7], rows[:,8], rows[:,1].astype(int)
+    scalar = [model.mass_loss(*row) for row in zip(mt.tolist(), Mc.tolist(), McCO.tolist(), L.tolist(), R.tolist(), stage.tolist())]
+    assert model.mass_loss_v(mt, Mc, McCO, L, R, stage) == pytest.approx(scalar, rel=1e-11)